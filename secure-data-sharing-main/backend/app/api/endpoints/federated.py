@@ -1,16 +1,17 @@
 # Federated Learning API Endpoints
-from fastapi import APIRouter, HTTPException, status
-from typing import List
+from fastapi import APIRouter, HTTPException, Request, status
+from typing import List, Optional
 import numpy as np
 
+from app.core.responses import ORJSONResponse
 from app.federated.server import get_federated_server, reset_federated_server
 from app.schemas.federated import (
     ClientRegisterRequest, ClientRegisterResponse,
     GlobalModelResponse, 
     ClientUpdateRequest, ClientUpdateResponse,
-    RoundCompleteResponse, AggregationResult,
+    RoundCompleteResponse,
     ServerStatusResponse,
-    TrainingHistoryResponse, RoundHistoryItem,
+    TrainingHistoryResponse, SnapshotResponse,
     PredictionRequest, PredictionResponse,
     StartRoundRequest, StartRoundResponse,
     InitModelRequest, InitModelResponse
@@ -18,12 +19,16 @@ from app.schemas.federated import (
 
 router = APIRouter()
 
+# The FL server is a process-wide singleton: bind it once instead of looking it
+# up on every request. /init swaps in a fresh instance and rebinds this name.
+_server = get_federated_server()
+
 
 # --- Server Status ---
 @router.get("/status", response_model=ServerStatusResponse, summary="Get FL Server Status")
 def get_server_status():
     """Get the current status of the federated learning server."""
-    server = get_federated_server()
+    server = _server
     status_data = server.get_status()
     return ServerStatusResponse(**status_data)
 
@@ -32,7 +37,8 @@ def get_server_status():
 @router.post("/init", response_model=InitModelResponse, summary="Initialize Global Model")
 def initialize_model(request: InitModelRequest):
     """Initialize or reset the global model with specified number of features."""
-    server = reset_federated_server(num_features=request.num_features)
+    global _server
+    server = _server = reset_federated_server(num_features=request.num_features)
     
     if request.weights is not None:
         if len(request.weights) != request.num_features:
@@ -47,18 +53,18 @@ def initialize_model(request: InitModelRequest):
     else:
         server.initialize_global_model()
     
-    return InitModelResponse(
-        status="initialized",
-        num_features=request.num_features,
-        global_model=GlobalModelResponse(**server.get_global_model())
-    )
+    return ORJSONResponse({
+        "status": "initialized",
+        "num_features": request.num_features,
+        "global_model": server.get_global_model()
+    })
 
 
 # --- Client Registration ---
 @router.post("/register", response_model=ClientRegisterResponse, summary="Register Client")
 def register_client(request: ClientRegisterRequest):
     """Register a new client for federated learning."""
-    server = get_federated_server()
+    server = _server
     result = server.register_client(request.client_id, request.metadata)
     return ClientRegisterResponse(**result)
 
@@ -66,7 +72,7 @@ def register_client(request: ClientRegisterRequest):
 @router.delete("/unregister/{client_id}", summary="Unregister Client")
 def unregister_client(client_id: str):
     """Remove a client from the federation."""
-    server = get_federated_server()
+    server = _server
     success = server.unregister_client(client_id)
     if not success:
         raise HTTPException(
@@ -80,15 +86,16 @@ def unregister_client(client_id: str):
 @router.get("/model", response_model=GlobalModelResponse, summary="Get Global Model")
 def get_global_model():
     """Get the current global model parameters."""
-    server = get_federated_server()
-    return GlobalModelResponse(**server.get_global_model())
+    server = _server
+    # Weights stay an ndarray; orjson writes it without a per-element .tolist()
+    return ORJSONResponse(server.get_global_model())
 
 
 # --- Round Management ---
 @router.post("/round/start", response_model=StartRoundResponse, summary="Start Training Round")
 def start_training_round(request: StartRoundRequest = StartRoundRequest()):
     """Start a new federated learning round."""
-    server = get_federated_server()
+    server = _server
     result = server.start_round()
     
     if result["status"] == "error":
@@ -98,17 +105,13 @@ def start_training_round(request: StartRoundRequest = StartRoundRequest()):
             registered_clients=result.get("registered_clients")
         )
     
-    return StartRoundResponse(
-        status=result["status"],
-        round=result["round"],
-        global_model=GlobalModelResponse(**result["global_model"])
-    )
+    return ORJSONResponse(result)
 
 
 @router.post("/round/aggregate", response_model=RoundCompleteResponse, summary="Aggregate Round")
 def aggregate_round():
     """Aggregate all client updates and update the global model."""
-    server = get_federated_server()
+    server = _server
     result = server.aggregate_round()
     
     if result["status"] == "error":
@@ -123,19 +126,14 @@ def aggregate_round():
             detail=result["message"]
         )
     
-    return RoundCompleteResponse(
-        status=result["status"],
-        round=result["round"],
-        aggregation_result=AggregationResult(**result["aggregation_result"]),
-        global_model=GlobalModelResponse(**result["global_model"])
-    )
+    return ORJSONResponse(result)
 
 
 # --- Client Updates ---
 @router.post("/update", response_model=ClientUpdateResponse, summary="Submit Model Update")
 def submit_model_update(request: ClientUpdateRequest):
     """Submit a model update from a client."""
-    server = get_federated_server()
+    server = _server
     
     # Validate weights length
     expected_features = server.num_features
@@ -147,7 +145,7 @@ def submit_model_update(request: ClientUpdateRequest):
     
     result = server.submit_update(
         client_id=request.client_id,
-        weights=request.weights,
+        weights=np.asarray(request.weights, dtype=np.float32),
         bias=request.bias,
         num_samples=request.num_samples,
         local_accuracy=request.local_accuracy
@@ -162,25 +160,86 @@ def submit_model_update(request: ClientUpdateRequest):
     return ClientUpdateResponse(**result)
 
 
+# Element types accepted by /update/raw; float16 halves the upload again and is
+# widened to float32 on arrival, which FedAvg tolerates without accuracy loss
+RAW_WEIGHT_DTYPES = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2")}
+
+
+@router.post("/update/raw", response_model=ClientUpdateResponse, summary="Submit Model Update (binary)")
+async def submit_model_update_raw(request: Request, client_id: str, bias: float,
+                                  num_samples: int, local_accuracy: Optional[float] = None,
+                                  dtype: str = "float32"):
+    """
+    Same as /update, but the body is the raw weight vector (application/octet-stream,
+    little-endian float32 or float16 as given by `dtype`); the other fields are query parameters.
+    """
+    server = _server
+    weight_dtype = RAW_WEIGHT_DTYPES.get(dtype)
+    if weight_dtype is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"dtype must be one of {sorted(RAW_WEIGHT_DTYPES)}"
+        )
+    if num_samples < 1 or (local_accuracy is not None and not 0 <= local_accuracy <= 1):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="num_samples must be >= 1 and local_accuracy within [0, 1]"
+        )
+    
+    body = await request.body()
+    expected_size = server.num_features * weight_dtype.itemsize
+    if len(body) != expected_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Body length ({len(body)}) must be num_features * {weight_dtype.itemsize} ({expected_size})"
+        )
+    
+    result = server.submit_update(
+        client_id=client_id,
+        weights=np.frombuffer(body, dtype=weight_dtype).astype(np.float32),
+        bias=bias,
+        num_samples=num_samples,
+        local_accuracy=local_accuracy
+    )
+    
+    if result["status"] == "error":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=result["message"]
+        )
+    
+    return ClientUpdateResponse(**result)
+
+
 # --- Training History ---
 @router.get("/history", response_model=TrainingHistoryResponse, summary="Get Training History")
 def get_training_history():
     """Get the full training history."""
-    server = get_federated_server()
-    history = server.get_training_history()
-    return TrainingHistoryResponse(
-        history=[RoundHistoryItem(**item) for item in history]
-    )
+    server = _server
+    # The records are built by the server with exactly RoundHistoryItem's fields;
+    # hand them to orjson as-is instead of constructing one model per round
+    return ORJSONResponse({"history": server.get_training_history()})
+
+
+# --- Snapshot ---
+@router.get("/snapshot", response_model=SnapshotResponse, summary="Get Model and History")
+def get_snapshot(include_history: bool = True):
+    """Current global model plus (optionally) the training history in one round-trip."""
+    server = _server
+    snapshot = {"global_model": server.get_global_model()}
+    if include_history:
+        snapshot["history"] = server.get_training_history()
+    return ORJSONResponse(snapshot)
 
 
 # --- Prediction ---
 @router.post("/predict", response_model=PredictionResponse, summary="Make Predictions")
 def make_predictions(request: PredictionRequest):
     """Make predictions using the current global model."""
-    server = get_federated_server()
+    server = _server
     
     try:
-        X = np.array(request.data)
+        X = np.asarray(request.data, dtype=np.float32)
         if X.ndim == 1:
             X = X.reshape(1, -1)
         
@@ -190,13 +249,11 @@ def make_predictions(request: PredictionRequest):
                 detail=f"Feature count ({X.shape[1]}) must match model features ({server.num_features})"
             )
         
-        predictions = server.predict(X)
-        probabilities = server.predict_proba(X)
+        # One matmul + sigmoid yields both outputs
+        predictions, probabilities = server.predict_both(X)
         
-        return PredictionResponse(
-            predictions=predictions.tolist(),
-            probabilities=probabilities.tolist()
-        )
+        # orjson serializes the arrays directly - no per-element Python objects
+        return ORJSONResponse({"predictions": predictions, "probabilities": probabilities})
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -204,11 +261,33 @@ def make_predictions(request: PredictionRequest):
         )
 
 
+@router.post("/predict/raw", response_model=PredictionResponse, summary="Make Predictions (binary)")
+async def make_predictions_raw(request: Request):
+    """
+    Same as /predict, but the body is the raw feature matrix: row-major
+    little-endian float32 (application/octet-stream), num_features per row.
+    Skips JSON parsing and per-float Python objects entirely.
+    """
+    server = _server
+    body = await request.body()
+    
+    row_size = server.num_features * 4
+    if not body or len(body) % row_size != 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Body length ({len(body)}) must be a non-zero multiple of num_features * 4 ({row_size})"
+        )
+    
+    X = np.frombuffer(body, dtype="<f4").reshape(-1, server.num_features)
+    predictions, probabilities = server.predict_both(X)
+    return ORJSONResponse({"predictions": predictions, "probabilities": probabilities})
+
+
 # --- Model Persistence ---
 @router.post("/model/save", summary="Save Global Model")
 def save_model():
     """Manually save the current global model."""
-    server = get_federated_server()
+    server = _server
     filepath = server._save_global_model()
     return {"status": "saved", "filepath": filepath}
 
@@ -216,7 +295,7 @@ def save_model():
 @router.post("/model/load", summary="Load Global Model")
 def load_model(filepath: str = None):
     """Load a global model from disk."""
-    server = get_federated_server()
+    server = _server
     result = server.load_global_model(filepath)
     
     if result["status"] == "error":
@@ -225,14 +304,14 @@ def load_model(filepath: str = None):
             detail=result["message"]
         )
     
-    return result
+    return ORJSONResponse(result)
 
 
 # --- Registered Clients ---
 @router.get("/clients", summary="Get Registered Clients")
 def get_registered_clients():
     """Get list of all registered clients."""
-    server = get_federated_server()
+    server = _server
     return {
         "clients": list(server.registered_clients.keys()),
         "count": len(server.registered_clients),
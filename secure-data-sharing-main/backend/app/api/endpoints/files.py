@@ -1,70 +1,176 @@
 import os
 import io
-from datetime import datetime
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form
-from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
+import uuid
+import asyncio
+import base64
+import logging
+import aiofiles
+import aiofiles.os
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 
 from app.database import get_db
 from app.dependencies import get_current_user
-from app.core.crypto import encrypt_data, decrypt_data
+from app.core.crypto import decrypt_data, stream_encryptor, stream_decryptor, STREAM_MAGIC
+from app.core.scanner import ContentScanner, analyze_file_threat, analyze_file_with_content
 from app.models.user import User
 from app.models.file_record import FileRecord
 from app.models.data_sharing import DataAccessPermission
 from app.crud import user as user_crud
+from app.crud import data_sharing as data_sharing_crud
+from app.crud import scan_cache as scan_cache_crud
 
 # Define the directory where uploaded files will be stored
 UPLOAD_DIR = "uploaded_files"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Uploads/downloads are read, scanned and (de)crypted in chunks of this size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def _stored_filename(user_id: int, filename: str) -> str:
+    """Unique on-disk name; the client filename is reduced to its basename so it cannot escape UPLOAD_DIR."""
+    safe_name = os.path.basename((filename or "").replace("\\", "/")) or "upload"
+    return f"{user_id}_{uuid.uuid4().hex}_{safe_name}.enc"
+
+
+async def _remove_stored_file(file_path: str) -> None:
+    """Best-effort cleanup of a partially written or rejected upload."""
+    try:
+        await aiofiles.os.remove(file_path)
+    except OSError:
+        pass
+
+
+async def _iter_decrypted(file_path: str):
+    """Yield plaintext chunks of a stream-encrypted file, decrypting off the event loop."""
+    decryptor = stream_decryptor()
+    async with aiofiles.open(file_path, "rb") as f:
+        while chunk := await f.read(DOWNLOAD_CHUNK_SIZE):
+            data = await asyncio.to_thread(decryptor.update, chunk)
+            if data:
+                yield data
+    yield await asyncio.to_thread(decryptor.finalize)
+
+
+def _encrypted_file_response(file_path: str, file_record: FileRecord) -> FileResponse:
+    """Serve still-encrypted bytes untouched straight from disk (sendfile where available)."""
+    return FileResponse(
+        file_path,
+        media_type="application/octet-stream",
+        filename=f"{file_record.filename}.encrypted",
+        headers={"X-Encrypted": "true"}
+    )
+
+
+async def _prepend(first: bytes, rest):
+    yield first
+    async for chunk in rest:
+        yield chunk
+
+
+def _finalize_upload(db: Session, scanner: Optional[ContentScanner], filename: str,
+                     content_type: Optional[str], reported_size: int, size_bytes: int,
+                     stored_filename: str, owner_id: int):
+    """
+    Blocking tail of /upload: finish the content scan and, unless it marks the file
+    as malicious, save its metadata. Returns (scan_result, file_id); file_id is None
+    when the upload must be rejected.
+    """
+    scan_result = None
+    content_result = None
+    if scanner is not None:
+        try:
+            if scanner.bytes_scanned:
+                content_result = scanner.finalize()
+            scan_result = analyze_file_with_content(filename, file_size=reported_size,
+                                                    scanner=scanner, content_result=content_result)
+        except Exception:
+            scan_result = None
+            content_result = None
+
+    if scan_result and scan_result.get("threat_score", 0) >= 70:
+        return scan_result, None
+
+    # Save metadata to the database, now including the stored_filename
+    db_file_record = FileRecord(
+        filename=filename,
+        stored_filename=stored_filename,
+        file_type=content_type,
+        size_bytes=size_bytes,
+        encryption_mode="server",
+        content_sha256=content_result["file_hash"] if content_result else None,
+        owner_id=owner_id
+    )
+    db.add(db_file_record)
+    # Later deep scans of this content reuse the upload-time result
+    if content_result:
+        scan_cache_crud.save_scan(db, filename, content_result)
+    db.commit()
+    db.refresh(db_file_record)
+    return scan_result, db_file_record.id
+
 
 @router.post("/upload")
-def upload_file(
+async def upload_file(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Encrypts any uploaded file, stores it, and saves its metadata to the database."""
-    contents = file.file.read()
+    # Content scan runs on the same chunks we encrypt (best-effort)
+    try:
+        scanner = ContentScanner(file.filename)
+    except Exception:
+        scanner = None
+
+    # Store the encrypted file physically with a unique name to avoid conflicts
+    stored_filename = _stored_filename(current_user.id, file.filename)
+    file_path = os.path.join(UPLOAD_DIR, stored_filename)
+
+    # Stream upload -> encryptor -> disk one chunk at a time, so memory use
+    # stays O(chunk) instead of holding plaintext and ciphertext for the whole file
+    encryptor = stream_encryptor()
+
+    def process_chunk(chunk: bytes) -> bytes:
+        if scanner is not None:
+            scanner.update(chunk)
+        return encryptor.update(chunk)
 
-    # Perform a content scan before encrypting/storing the file (best-effort)
+    size_bytes = 0
     try:
-        # Import locally to avoid circular imports at module load time
-        from app.api.endpoints.ml import analyze_file_with_content
-        scan_result = analyze_file_with_content(file.filename, contents, file.size or len(contents))
+        async with aiofiles.open(file_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size_bytes += len(chunk)
+                # Scanning + AES are CPU-bound; keep them off the event loop
+                await f.write(await asyncio.to_thread(process_chunk, chunk))
+            await f.write(encryptor.finalize())
     except Exception:
-        scan_result = None
+        await _remove_stored_file(file_path)
+        raise
+
+    # Scan finalization/analysis (CPU-bound) and the SQLite writes all block, so they
+    # run together on a worker thread instead of on the event loop
+    scan_result, file_id = await asyncio.to_thread(
+        _finalize_upload, db, scanner, file.filename, file.content_type,
+        file.size or size_bytes, size_bytes, stored_filename, current_user.id
+    )
 
     # If scan finds a high threat, reject the upload
-    if scan_result and scan_result.get("threat_score", 0) >= 70:
+    if file_id is None:
+        await _remove_stored_file(file_path)
         raise HTTPException(status_code=400, detail={
             "message": "Upload blocked: file detected as malicious",
             "scan_result": scan_result
         })
-
-    encrypted_contents = encrypt_data(contents)
-
-    # Store the encrypted file physically with a unique name to avoid conflicts
-    stored_filename = f"{current_user.id}_{datetime.utcnow().timestamp()}_{file.filename}.enc"
-    file_path = os.path.join(UPLOAD_DIR, stored_filename)
-    with open(file_path, "wb") as f:
-        f.write(encrypted_contents)
-
-    # Save metadata to the database, now including the stored_filename
-    db_file_record = FileRecord(
-        filename=file.filename,
-        stored_filename=stored_filename,
-        file_type=file.content_type,
-        size_bytes=file.size,
-        owner_id=current_user.id
-    )
-    db.add(db_file_record)
-    db.commit()
-    db.refresh(db_file_record)
     
-    response = {"message": f"File '{file.filename}' uploaded securely.", "file_id": db_file_record.id}
+    response = {"message": f"File '{file.filename}' uploaded securely.", "file_id": file_id}
     if scan_result:
         response["scan_result"] = scan_result
     return response
@@ -86,37 +192,43 @@ async def upload_file_e2e(
     SECURITY: File is scanned for threats BEFORE client-side encryption occurs.
     The filename is analyzed for malicious patterns.
     """
-    contents = await file.read()
+    # Store the encrypted file directly (already encrypted by client), streaming it to disk
+    stored_filename = _stored_filename(current_user.id, file.filename)
+    file_path = os.path.join(UPLOAD_DIR, stored_filename)
+    size_bytes = 0
+    try:
+        async with aiofiles.open(file_path, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size_bytes += len(chunk)
+                await f.write(chunk)
+    except Exception:
+        await _remove_stored_file(file_path)
+        raise
     
     # SECURITY SCAN: Analyze filename for malicious patterns before storing
     # Since file is client-encrypted, we scan filename + metadata patterns
     try:
-        from app.api.endpoints.ml import analyze_file_threat
         # Get original filename (remove .encrypted suffix for analysis)
         original_filename = file.filename.replace('.encrypted', '')
-        scan_result = analyze_file_threat(original_filename, len(contents))
+        scan_result = analyze_file_threat(original_filename, size_bytes)
     except Exception:
         scan_result = None
 
     # If scan finds a high threat based on filename patterns, reject the upload
     if scan_result and scan_result.get("threat_score", 0) >= 70:
+        await _remove_stored_file(file_path)
         raise HTTPException(status_code=400, detail={
             "message": "Upload blocked: file detected as potentially malicious",
             "scan_result": scan_result
         })
-    
-    # Store the encrypted file directly (already encrypted by client)
-    stored_filename = f"{current_user.id}_{datetime.utcnow().timestamp()}_{file.filename}.enc"
-    file_path = os.path.join(UPLOAD_DIR, stored_filename)
-    with open(file_path, "wb") as f:
-        f.write(contents)
 
     # Save metadata to the database
     db_file_record = FileRecord(
         filename=file.filename.replace('.encrypted', ''),  # Remove .encrypted suffix if present
         stored_filename=stored_filename,
         file_type=file.content_type,
-        size_bytes=len(contents),
+        size_bytes=size_bytes,
+        encryption_mode="e2e",
         owner_id=current_user.id
     )
     db.add(db_file_record)
@@ -154,109 +266,158 @@ async def upload_file_e2e(
         response["scan_result"] = scan_result
     return response
 
-@router.get("/download/{file_id}")
-def download_file(
+def get_downloadable_file(
     file_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Allows a user to download a file.
-    For server-encrypted files, it decrypts before sending.
-    For client-encrypted (E2E) files, it returns the encrypted data for client-side decryption.
+    Dependency: returns (file_record, permission, is_owner) or raises if the user may not
+    download the file. File and permission are fetched together in a single query.
     """
-    # 1. Find the file record in the database
-    file_record = db.query(FileRecord).filter(FileRecord.id == file_id).first()
+    file_record, permission = data_sharing_crud.get_file_and_permission(db, file_id, current_user.id)
     if not file_record:
         raise HTTPException(status_code=404, detail="File not found.")
 
-    # 2. Check for authorization
     is_owner = file_record.owner_id == current_user.id
-    permission = db.query(DataAccessPermission).filter_by(file_id=file_id, shared_with_user_id=current_user.id).first()
     is_shared = permission is not None
 
     if not (is_owner or is_shared):
         raise HTTPException(status_code=403, detail="Not authorized to download this file.")
 
-    # 3. Read the encrypted file from disk
+    return file_record, permission, is_owner
+
+
+@router.get("/download/{file_id}")
+async def download_file(
+    file_id: int,
+    access: tuple = Depends(get_downloadable_file)
+):
+    """
+    Allows a user to download a file.
+    For server-encrypted files, it decrypts before sending.
+    For client-encrypted (E2E) files, it returns the encrypted data for client-side decryption.
+    """
+    # 1-2. File record + authorization (resolved by the get_downloadable_file dependency)
+    file_record, _, _ = access
+
+    # 3. Locate the encrypted file on disk
     file_path = os.path.join(UPLOAD_DIR, file_record.stored_filename)
-    if not os.path.exists(file_path):
+    if not await aiofiles.os.path.exists(file_path):
         raise HTTPException(status_code=500, detail="File is missing from storage. Please contact an administrator.")
 
-    with open(file_path, "rb") as f:
-        encrypted_data = f.read()
+    # 4. Client-encrypted files are served as-is without touching the bytes
+    if file_record.encryption_mode == "e2e":
+        return _encrypted_file_response(file_path, file_record)
+
+    async with aiofiles.open(file_path, "rb") as f:
+        header = await f.read(len(STREAM_MAGIC))
 
-    # 4. Try to decrypt (for server-encrypted files) or return as-is (for E2E encrypted)
+    # Try to decrypt (server-encrypted; older records without a mode may still be E2E)
     try:
-        decrypted_data = decrypt_data(encrypted_data)
+        if header == STREAM_MAGIC:
+            # Decrypt the first chunk up front so a bad file falls through to the E2E branch
+            # before any response headers are sent; the rest is decrypted as it streams out
+            chunks = _iter_decrypted(file_path)
+            try:
+                first = await anext(chunks)
+            except Exception:
+                await chunks.aclose()
+                raise
+            body = _prepend(first, chunks)
+        else:
+            # Legacy Fernet token: must be decrypted in one piece
+            async with aiofiles.open(file_path, "rb") as f:
+                encrypted_data = await f.read()
+            body = io.BytesIO(await asyncio.to_thread(decrypt_data, encrypted_data))
         # Server-encrypted file, return decrypted
         return StreamingResponse(
-            io.BytesIO(decrypted_data),
+            body,
             media_type="application/octet-stream",
             headers={"Content-Disposition": f"attachment; filename={file_record.filename}"}
         )
     except Exception:
         # E2E encrypted file, return encrypted data for client-side decryption
-        return StreamingResponse(
-            io.BytesIO(encrypted_data),
-            media_type="application/octet-stream",
-            headers={
-                "Content-Disposition": f"attachment; filename={file_record.filename}.encrypted",
-                "X-Encrypted": "true"
-            }
-        )
+        return _encrypted_file_response(file_path, file_record)
 
 @router.get("/download-e2e/{file_id}")
-def download_file_e2e(
+async def download_file_e2e(
     file_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    access: tuple = Depends(get_downloadable_file)
 ):
     """
     Download E2E encrypted file along with the encrypted AES key.
     Returns the encrypted file data and the encrypted AES key for client-side decryption.
-    """
-    file_record = db.query(FileRecord).filter(FileRecord.id == file_id).first()
-    if not file_record:
-        raise HTTPException(status_code=404, detail="File not found.")
-
-    is_owner = file_record.owner_id == current_user.id
-    permission = db.query(DataAccessPermission).filter_by(file_id=file_id, shared_with_user_id=current_user.id).first()
-    is_shared = permission is not None
 
-    if not (is_owner or is_shared):
-        raise HTTPException(status_code=403, detail="Not authorized to download this file.")
+    Prefer /download-e2e/{file_id}/key + /download-e2e/{file_id}/data for large files:
+    this endpoint has to base64-encode the whole file into the JSON body.
+    """
+    file_record, permission, is_owner = access
 
     file_path = os.path.join(UPLOAD_DIR, file_record.stored_filename)
-    if not os.path.exists(file_path):
+    if not await aiofiles.os.path.exists(file_path):
         raise HTTPException(status_code=500, detail="File is missing from storage.")
 
-    with open(file_path, "rb") as f:
-        encrypted_data = f.read()
+    async with aiofiles.open(file_path, "rb") as f:
+        encrypted_data = await f.read()
 
     # Get the encrypted AES key if this is a shared file
     encrypted_aes_key = permission.encrypted_aes_key if permission else None
 
-    import base64
+    encoded = await asyncio.to_thread(base64.b64encode, encrypted_data)
     return {
         "filename": file_record.filename,
         "file_type": file_record.file_type,
-        "encrypted_data": base64.b64encode(encrypted_data).decode('utf-8'),
+        "encrypted_data": encoded.decode('utf-8'),
         "encrypted_aes_key": encrypted_aes_key,
         "is_owner": is_owner
     }
 
+@router.get("/download-e2e/{file_id}/key")
+def download_file_e2e_key(
+    file_id: int,
+    access: tuple = Depends(get_downloadable_file)
+):
+    """Metadata and encrypted AES key of an E2E file; fetch the bytes from /download-e2e/{file_id}/data."""
+    file_record, permission, is_owner = access
+    return {
+        "filename": file_record.filename,
+        "file_type": file_record.file_type,
+        "encrypted_aes_key": permission.encrypted_aes_key if permission else None,
+        "is_owner": is_owner
+    }
+
+@router.get("/download-e2e/{file_id}/data")
+async def download_file_e2e_data(
+    file_id: int,
+    access: tuple = Depends(get_downloadable_file)
+):
+    """Raw client-encrypted bytes of an E2E file, streamed from disk without buffering or base64."""
+    file_record, _, _ = access
+
+    file_path = os.path.join(UPLOAD_DIR, file_record.stored_filename)
+    if not await aiofiles.os.path.exists(file_path):
+        raise HTTPException(status_code=500, detail="File is missing from storage.")
+
+    return _encrypted_file_response(file_path, file_record)
+
 
 @router.get("/list")
 def list_my_files(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Lists all files owned by the current user with sharing info."""
-    files = db.query(FileRecord).filter(FileRecord.owner_id == current_user.id).order_by(FileRecord.upload_date.desc()).all()
+    # Files, their permissions, then each distinct recipient once via a single IN (...) batch
+    files = (
+        db.query(FileRecord)
+        .options(selectinload(FileRecord.shared_with).selectinload(DataAccessPermission.shared_with_user))
+        .filter(FileRecord.owner_id == current_user.id)
+        .order_by(FileRecord.upload_date.desc())
+        .all()
+    )
     result = []
     for f in files:
-        shared_with = db.query(DataAccessPermission).filter(DataAccessPermission.file_id == f.id).all()
         shared_users = []
-        for perm in shared_with:
-            user = db.query(User).filter(User.id == perm.shared_with_user_id).first()
+        for perm in f.shared_with:
+            user = perm.shared_with_user
             if user:
                 shared_users.append({"id": user.id, "username": user.username, "shared_at": perm.shared_at})
         result.append({
@@ -272,12 +433,12 @@ def list_my_files(db: Session = Depends(get_db), current_user: User = Depends(ge
 @router.get("/shared-with-me")
 def list_shared_files(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """Lists all files shared with the current user."""
-    permissions = db.query(DataAccessPermission).filter(DataAccessPermission.shared_with_user_id == current_user.id).all()
+    permissions = data_sharing_crud.get_files_shared_with_user(db, current_user.id)
     shared_files_details = []
     for perm in permissions:
-        file_record = db.query(FileRecord).filter(FileRecord.id == perm.file_id).first()
+        file_record = perm.file
         if file_record:
-            owner = db.query(User).filter(User.id == file_record.owner_id).first()
+            owner = file_record.owner
             shared_files_details.append({
                 "id": file_record.id,
                 "filename": file_record.filename,
@@ -290,7 +451,7 @@ def list_shared_files(db: Session = Depends(get_db), current_user: User = Depend
             })
     return shared_files_details
 
-@router.post("/share/{file_id}")
+@router.post("/share/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
 def share_file(
     file_id: int,
     recipient_username: str,
@@ -298,18 +459,17 @@ def share_file(
     current_user: User = Depends(get_current_user)
 ):
     """Shares a file with another registered user."""
-    file_record = db.query(FileRecord).filter(FileRecord.id == file_id, FileRecord.owner_id == current_user.id).first()
-    if not file_record:
+    # File, recipient and any existing share in one JOINed query
+    file_record, recipient, existing_perm = data_sharing_crud.get_file_user_and_permission(db, file_id, recipient_username)
+    if not file_record or file_record.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="File not found or you are not the owner.")
 
-    recipient = user_crud.get_user_by_username(db, username=recipient_username)
     if not recipient:
         raise HTTPException(status_code=404, detail=f"User '{recipient_username}' not found.")
     
     if recipient.id == current_user.id:
         raise HTTPException(status_code=400, detail="You cannot share a file with yourself.")
 
-    existing_perm = db.query(DataAccessPermission).filter_by(file_id=file_id, shared_with_user_id=recipient.id).first()
     if existing_perm:
         raise HTTPException(status_code=400, detail=f"File already shared with '{recipient_username}'.")
 
@@ -317,9 +477,9 @@ def share_file(
     db.add(permission)
     db.commit()
     
-    return {"message": f"File '{file_record.filename}' successfully shared with '{recipient_username}'."}
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-@router.post("/share-e2e/{file_id}")
+@router.post("/share-e2e/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
 def share_file_e2e(
     file_id: int,
     recipient_username: str = Form(...),
@@ -328,11 +488,11 @@ def share_file_e2e(
     current_user: User = Depends(get_current_user)
 ):
     """Share an E2E encrypted file with another user, providing the encrypted AES key."""
-    file_record = db.query(FileRecord).filter(FileRecord.id == file_id, FileRecord.owner_id == current_user.id).first()
-    if not file_record:
+    # File, recipient and any existing share in one JOINed query
+    file_record, recipient, existing_perm = data_sharing_crud.get_file_user_and_permission(db, file_id, recipient_username)
+    if not file_record or file_record.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="File not found or you are not the owner.")
 
-    recipient = user_crud.get_user_by_username(db, username=recipient_username)
     if not recipient:
         raise HTTPException(status_code=404, detail=f"User '{recipient_username}' not found.")
     
@@ -342,7 +502,6 @@ def share_file_e2e(
     if recipient.id == current_user.id:
         raise HTTPException(status_code=400, detail="You cannot share a file with yourself.")
 
-    existing_perm = db.query(DataAccessPermission).filter_by(file_id=file_id, shared_with_user_id=recipient.id).first()
     if existing_perm:
         raise HTTPException(status_code=400, detail=f"File already shared with '{recipient_username}'.")
 
@@ -354,9 +513,9 @@ def share_file_e2e(
     db.add(permission)
     db.commit()
     
-    return {"message": f"File '{file_record.filename}' securely shared with '{recipient_username}'."}
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-@router.delete("/revoke/{file_id}/{username}")
+@router.delete("/revoke/{file_id}/{username}", status_code=status.HTTP_204_NO_CONTENT)
 def revoke_file_access(
     file_id: int,
     username: str,
@@ -364,45 +523,48 @@ def revoke_file_access(
     current_user: User = Depends(get_current_user)
 ):
     """Revoke a user's access to a shared file."""
-    file_record = db.query(FileRecord).filter(FileRecord.id == file_id, FileRecord.owner_id == current_user.id).first()
-    if not file_record:
+    file_record, user, permission = data_sharing_crud.get_file_user_and_permission(db, file_id, username)
+    if not file_record or file_record.owner_id != current_user.id:
         raise HTTPException(status_code=404, detail="File not found or you are not the owner.")
 
-    user = user_crud.get_user_by_username(db, username=username)
     if not user:
         raise HTTPException(status_code=404, detail=f"User '{username}' not found.")
 
-    permission = db.query(DataAccessPermission).filter_by(file_id=file_id, shared_with_user_id=user.id).first()
     if not permission:
         raise HTTPException(status_code=404, detail=f"File is not shared with '{username}'.")
 
     db.delete(permission)
     db.commit()
     
-    return {"message": f"Access revoked for '{username}'."}
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-@router.delete("/delete/{file_id}")
-def delete_file(
+@router.delete("/delete/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_file(
     file_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Deletes a file record from the DB and the corresponding encrypted file from storage."""
-    file_record = db.query(FileRecord).filter(FileRecord.id == file_id, FileRecord.owner_id == current_user.id).first()
+    # The handler is async for aiofiles; the blocking SQLite calls go to a worker thread
+    file_record = await asyncio.to_thread(
+        lambda: db.query(FileRecord).filter(FileRecord.id == file_id, FileRecord.owner_id == current_user.id).first()
+    )
     if not file_record:
         raise HTTPException(status_code=404, detail="File not found or you are not the owner.")
     
     # IMPROVEMENT: Directly use the stored_filename from the DB record
     file_path = os.path.join(UPLOAD_DIR, file_record.stored_filename)
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    except OSError as e:
-        # In a production system, you would log this error more formally
-        print(f"Error removing physical file {file_path}: {e}")
+        if await aiofiles.os.path.exists(file_path):
+            await aiofiles.os.remove(file_path)
+    except OSError:
+        logger.exception("Error removing physical file %s", file_path)
         raise HTTPException(status_code=500, detail="Could not remove file from storage.")
 
-    db.delete(file_record)
-    db.commit()
+    def delete_record():
+        db.delete(file_record)
+        db.commit()
+
+    await asyncio.to_thread(delete_record)
     
-    return {"message": f"File '{file_record.filename}' deleted successfully."}
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -6,39 +6,14 @@ from app.database import get_db
 from app.dependencies import get_current_user
 from app.models.user import User as UserModel
 from typing import List
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
-from cryptography.hazmat.backends import default_backend
+from app.core.key_pool import get_rsa_keypair
 
 router = APIRouter()
 
-def generate_rsa_keypair():
-    """Generate RSA key pair for encryption."""
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-        backend=default_backend()
-    )
-    public_key = private_key.public_key()
-    
-    # Serialize keys to PEM format
-    private_pem = private_key.private_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption()
-    ).decode('utf-8')
-    
-    public_pem = public_key.public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo
-    ).decode('utf-8')
-    
-    return private_pem, public_pem
-
 def ensure_user_has_keys(user: UserModel, db: Session):
     """Ensure a user has encryption keys, generate if missing."""
     if not user.public_key:
-        private_key, public_key = generate_rsa_keypair()
+        private_key, public_key = get_rsa_keypair()
         user.public_key = public_key
         user.private_key = private_key
         db.commit()
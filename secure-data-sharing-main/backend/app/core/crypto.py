@@ -1,5 +1,9 @@
 import os
+import base64
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 
 # Generate or load encryption key
 KEY_FILE = "secret.key"
@@ -13,10 +17,152 @@ def load_or_create_key():
         f.write(key)
     return key
 
-fernet = Fernet(load_or_create_key())
+_master_key = load_or_create_key()
+fernet = Fernet(_master_key)
 
 def encrypt_data(data: bytes) -> bytes:
-    return fernet.encrypt(data)
+    # AES-256-GCM (OpenSSL, AES-NI) in the stream format; Fernet is only kept for reading old files
+    prefix = os.urandom(_NONCE_PREFIX_SIZE)
+    header = STREAM_MAGIC + prefix
+    view = memoryview(data)
+    out = [header]
+    # Whole buffer is at hand, so seal straight from slices instead of going through StreamEncryptor's buffer
+    last = max(len(view) - 1, 0) // STREAM_SEGMENT_SIZE
+    for counter in range(last + 1):
+        segment = view[counter * STREAM_SEGMENT_SIZE:(counter + 1) * STREAM_SEGMENT_SIZE]
+        out.append(_stream_aead.encrypt(_segment_nonce(prefix, counter, counter == last), segment, header))
+    return b"".join(out)
 
 def decrypt_data(data: bytes) -> bytes:
+    if data.startswith(STREAM_MAGIC):
+        if len(data) < STREAM_HEADER_SIZE:
+            raise ValueError("Not a stream-encrypted file")
+        header = data[:STREAM_HEADER_SIZE]
+        prefix = header[len(STREAM_MAGIC):]
+        view = memoryview(data)[STREAM_HEADER_SIZE:]
+        sealed_size = STREAM_SEGMENT_SIZE + _TAG_SIZE
+        last = max(len(view) - 1, 0) // sealed_size
+        return b"".join(
+            _stream_aead.decrypt(
+                _segment_nonce(prefix, counter, counter == last),
+                view[counter * sealed_size:(counter + 1) * sealed_size],
+                header,
+            )
+            for counter in range(last + 1)
+        )
     return fernet.decrypt(data)
+
+
+# ---- Streaming (chunked) AES-256-GCM ----
+# Files are split into fixed-size segments, each sealed with its own GCM tag.
+# The nonce is <7-byte random prefix><4-byte segment counter><1-byte final flag>,
+# so segments cannot be reordered, dropped or truncated without detection.
+# On-disk layout: STREAM_MAGIC | nonce prefix | segment_0 | ... | final segment
+STREAM_MAGIC = b"SSE1"
+STREAM_SEGMENT_SIZE = 64 * 1024
+_NONCE_PREFIX_SIZE = 7
+_TAG_SIZE = 16
+STREAM_HEADER_SIZE = len(STREAM_MAGIC) + _NONCE_PREFIX_SIZE
+
+_stream_key = HKDF(
+    algorithm=hashes.SHA256(),
+    length=32,
+    salt=None,
+    info=b"secureshare stream encryption v1",
+).derive(base64.urlsafe_b64decode(_master_key))
+# Key derivation and cipher setup happen once per process; per file only the nonce prefix is new
+_stream_aead = AESGCM(_stream_key)
+
+
+def _segment_nonce(prefix: bytes, counter: int, final: bool) -> bytes:
+    return prefix + counter.to_bytes(4, "big") + (b"\x01" if final else b"\x00")
+
+
+class StreamEncryptor:
+    """Incrementally encrypts data; feed chunks to update(), then call finalize()."""
+
+    def __init__(self, aead=None):
+        self._aead = aead or _stream_aead
+        self._prefix = os.urandom(_NONCE_PREFIX_SIZE)
+        self._header = STREAM_MAGIC + self._prefix
+        self._counter = 0
+        self._buffer = bytearray()
+        self._header_sent = False
+
+    def _seal(self, segment: bytes, final: bool) -> bytes:
+        nonce = _segment_nonce(self._prefix, self._counter, final)
+        self._counter += 1
+        return self._aead.encrypt(nonce, segment, self._header)
+
+    def _take_header(self) -> bytes:
+        if self._header_sent:
+            return b""
+        self._header_sent = True
+        return self._header
+
+    def update(self, chunk: bytes) -> bytes:
+        self._buffer += chunk
+        out = [self._take_header()]
+        # Keep at least one byte buffered so the last segment is always sealed as final
+        while len(self._buffer) > STREAM_SEGMENT_SIZE:
+            segment = bytes(self._buffer[:STREAM_SEGMENT_SIZE])
+            del self._buffer[:STREAM_SEGMENT_SIZE]
+            out.append(self._seal(segment, final=False))
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        out = self._take_header() + self._seal(bytes(self._buffer), final=True)
+        self._buffer.clear()
+        return out
+
+
+class StreamDecryptor:
+    """Inverse of StreamEncryptor. Raises cryptography.exceptions.InvalidTag on tampering."""
+
+    def __init__(self, aead=None):
+        self._aead = aead or _stream_aead
+        self._header = None
+        self._prefix = None
+        self._counter = 0
+        self._buffer = bytearray()
+
+    def _open(self, segment: bytes, final: bool) -> bytes:
+        nonce = _segment_nonce(self._prefix, self._counter, final)
+        self._counter += 1
+        return self._aead.decrypt(nonce, segment, self._header)
+
+    def update(self, chunk: bytes) -> bytes:
+        self._buffer += chunk
+        if self._header is None:
+            if len(self._buffer) < STREAM_HEADER_SIZE:
+                return b""
+            header = bytes(self._buffer[:STREAM_HEADER_SIZE])
+            if not header.startswith(STREAM_MAGIC):
+                raise ValueError("Not a stream-encrypted file")
+            self._header = header
+            self._prefix = header[len(STREAM_MAGIC):]
+            del self._buffer[:STREAM_HEADER_SIZE]
+
+        out = []
+        sealed_size = STREAM_SEGMENT_SIZE + _TAG_SIZE
+        while len(self._buffer) > sealed_size:
+            segment = bytes(self._buffer[:sealed_size])
+            del self._buffer[:sealed_size]
+            out.append(self._open(segment, final=False))
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        if self._header is None:
+            raise ValueError("Not a stream-encrypted file")
+        out = self._open(bytes(self._buffer), final=True)
+        self._buffer.clear()
+        return out
+
+
+def stream_encryptor(aead=None) -> StreamEncryptor:
+    """aead defaults to the server key; pass an AESGCM/ChaCha20Poly1305 to seal under another key."""
+    return StreamEncryptor(aead)
+
+
+def stream_decryptor(aead=None) -> StreamDecryptor:
+    return StreamDecryptor(aead)
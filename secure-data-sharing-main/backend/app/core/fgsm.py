@@ -0,0 +1,200 @@
+# FGSM attack/defense demo (PyTorch).
+# Kept out of the endpoint module so torch is only imported when the demo runs.
+import copy
+import functools
+import threading
+import torch
+import torch.nn as nn
+import torch.optim as optim
+import numpy as np
+
+# The demo net (2-16-16-1) is far too small to benefit from intra-op parallelism; under
+# concurrent requests the default one-thread-per-core pools just oversubscribe the CPU.
+torch.set_num_threads(1)
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:  # can only be set before inter-op work has started in this process
+    pass
+
+# Train on the GPU with fp16 autocast + fused Adam when CUDA is available; plain fp32 on CPU otherwise
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+_USE_AMP = DEVICE.type == "cuda"
+
+
+class SimpleNNModel(nn.Module):
+    """Simple neural network for FGSM demonstration (outputs logits; apply sigmoid for probabilities)"""
+    def __init__(self, input_dim=2, hidden_dim=16):
+        super().__init__()
+        self.network = nn.Sequential(
+            nn.Linear(input_dim, hidden_dim),
+            nn.ReLU(),
+            nn.Linear(hidden_dim, hidden_dim),
+            nn.ReLU(),
+            nn.Linear(hidden_dim, 1)
+        )
+
+    def forward(self, x):
+        return self.network(x)
+
+
+def _autocast():
+    return torch.autocast(device_type=DEVICE.type, dtype=torch.float16, enabled=_USE_AMP)
+
+
+def _build_model():
+    """
+    Demo model on DEVICE. On CUDA it is wrapped in torch.compile (CUDA graphs via
+    "reduce-overhead") since the tiny net is launch-bound there; on CPU eager mode is
+    as fast once warm and compiling would add ~30s to the first request.
+    """
+    model = SimpleNNModel().to(DEVICE)
+    if DEVICE.type == "cuda":
+        model = torch.compile(model, mode="reduce-overhead", dynamic=False)
+    return model
+
+
+def _to_device(t):
+    """Copy a CPU tensor to DEVICE; pinned memory lets the non_blocking H2D copy overlap compute."""
+    if DEVICE.type == "cuda":
+        t = t.pin_memory()
+    return t.to(DEVICE, non_blocking=True)
+
+
+def _make_optimizer(model, lr):
+    return optim.Adam(model.parameters(), lr=lr, fused=_USE_AMP)
+
+
+def fgsm_attack(model, x, y, epsilon=0.15):
+    """Generate adversarial examples using FGSM"""
+    # Differentiate w.r.t. a zero perturbation instead of a cloned input; parameter grads are untouched
+    delta = torch.zeros_like(x, requires_grad=True)
+    with _autocast():
+        loss = nn.BCEWithLogitsLoss()(model(x + delta), y)
+    grad, = torch.autograd.grad(loss, delta)
+    return (x + epsilon * grad.sign()).detach()
+
+
+def train_normal_model(model, x, y, epochs=200, lr=0.01):
+    """Train model without adversarial defense"""
+    optimizer = _make_optimizer(model, lr)
+    scaler = torch.amp.GradScaler(DEVICE.type, enabled=_USE_AMP)
+    criterion = nn.BCEWithLogitsLoss()
+    for _ in range(epochs):
+        optimizer.zero_grad()
+        with _autocast():
+            loss = criterion(model(x), y)
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
+    return model
+
+
+def train_defended_model(model, x, y, epochs=200, lr=0.01, epsilon=0.15):
+    """
+    Train model with adversarial training (defense).
+    "Fast" FGSM training: random start inside the epsilon ball, one FGSM step
+    of size 1.25*epsilon, then train on the perturbed batch only.
+    """
+    optimizer = _make_optimizer(model, lr)
+    scaler = torch.amp.GradScaler(DEVICE.type, enabled=_USE_AMP)
+    criterion = nn.BCEWithLogitsLoss()
+    alpha = 1.25 * epsilon
+    # Perturbation and adversarial batch buffers are allocated once and refilled every epoch
+    delta = torch.empty_like(x, requires_grad=True)
+    x_adv = torch.empty_like(x)
+    for _ in range(epochs):
+        with torch.no_grad():
+            delta.uniform_(-epsilon, epsilon)
+        with _autocast():
+            loss = criterion(model(x + delta), y)
+        # Only the input gradient is needed here
+        grad, = torch.autograd.grad(scaler.scale(loss), delta)
+        with torch.no_grad():
+            # x_adv = x + clamp(delta + alpha * sign(grad), -epsilon, epsilon)
+            torch.add(delta, grad.sign_(), alpha=alpha, out=x_adv).clamp_(-epsilon, epsilon).add_(x)
+
+        optimizer.zero_grad(set_to_none=True)
+        with _autocast():
+            loss = criterion(model(x_adv), y)
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
+    return model
+
+
+def evaluate_model(model, x, y, epsilon=0.15):
+    """Evaluate model on clean and adversarial examples"""
+    x_adv = fgsm_attack(model, x, y, epsilon)
+    
+    # Clean and adversarial inputs share one batched forward pass.
+    # inference_mode rather than int8 quantization: at 16 hidden units quantize_dynamic
+    # was ~3x slower per forward (activation quantize/dequantize dominates).
+    model.eval()
+    with torch.inference_mode():
+        output_clean, output_adv = model(torch.cat([x, x_adv], dim=0)).chunk(2, dim=0)
+        acc_clean = ((output_clean > 0).float() == y).float().mean().item()
+        acc_adv = ((output_adv > 0).float() == y).float().mean().item()
+    
+    return acc_clean, acc_adv
+
+
+def run_demo() -> dict:
+    """Train a normal and an adversarially trained model and compare them under FGSM."""
+    torch.manual_seed(42)
+    np.random.seed(42)
+    
+    # Generate synthetic dataset
+    n_samples = 500
+    x = torch.rand((n_samples, 2)) * 2 - 1
+    y = ((x[:, 0] ** 2 + x[:, 1] ** 2) < 0.5).float().unsqueeze(1)
+    # One copy up front; the full batch is reused every epoch
+    x = _to_device(x)
+    y = _to_device(y)
+    
+    epsilon = 0.15
+    
+    # Train normal model
+    normal_model = _build_model()
+    train_normal_model(normal_model, x, y, epochs=200)
+    
+    # Train defended model
+    defended_model = _build_model()
+    train_defended_model(defended_model, x, y, epochs=200, epsilon=epsilon)
+    
+    # Evaluate both models
+    clean_acc_normal, adv_acc_normal = evaluate_model(normal_model, x, y, epsilon)
+    clean_acc_defended, adv_acc_defended = evaluate_model(defended_model, x, y, epsilon)
+    
+    return {
+        "status": "success",
+        "epsilon": epsilon,
+        "normal_model": {
+            "clean_accuracy": f"{clean_acc_normal * 100:.1f}%",
+            "adversarial_accuracy": f"{adv_acc_normal * 100:.1f}%",
+            "accuracy_drop": f"{(clean_acc_normal - adv_acc_normal) * 100:.1f}%"
+        },
+        "defended_model": {
+            "clean_accuracy": f"{clean_acc_defended * 100:.1f}%",
+            "adversarial_accuracy": f"{adv_acc_defended * 100:.1f}%",
+            "accuracy_drop": f"{(clean_acc_defended - adv_acc_defended) * 100:.1f}%"
+        },
+        "improvement": f"{(adv_acc_defended - adv_acc_normal) * 100:.1f}%",
+        "conclusion": "Adversarial training successfully improved model robustness against FGSM attacks"
+    }
+
+
+_demo_lock = threading.Lock()
+
+
+@functools.cache
+def _cached_demo() -> dict:
+    return run_demo()
+
+
+def get_demo_result() -> dict:
+    """
+    run_demo() is fully seeded, so it is computed once per process. The lock keeps
+    concurrent first requests from each training the models; callers get their own copy.
+    """
+    with _demo_lock:
+        return copy.deepcopy(_cached_demo())
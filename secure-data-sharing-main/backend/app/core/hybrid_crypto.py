@@ -1,19 +1,81 @@
-from cryptography.fernet import Fernet
+import os
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from .crypto import STREAM_SEGMENT_SIZE, stream_encryptor, stream_decryptor
 from .rsa_utils import encrypt_aes_key, decrypt_aes_key
 
+_NONCE_SIZE = 12
+
+# Envelope: <1-byte algorithm tag><12-byte nonce><ciphertext + tag>.
+# Both AEADs take a 32-byte key and 12-byte nonce, so only the tag differs;
+# decrypt routes on it, so data written on one host opens on any other.
+ALG_AES_GCM = 1
+ALG_CHACHA20_POLY1305 = 2
+_AEADS = {ALG_AES_GCM: AESGCM, ALG_CHACHA20_POLY1305: ChaCha20Poly1305}
+
+
+def _has_aes_instructions() -> bool:
+    # Linux reports AES-NI (x86) / ARMv8 crypto extensions as an "aes" cpuinfo flag.
+    # Elsewhere assume AES hardware, which every current x86 and Apple Silicon CPU has.
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return "aes" in line.split(":", 1)[1].split()
+    except OSError:
+        pass
+    return True
+
+
+# Without AES instructions, software ChaCha20-Poly1305 is several times faster than AES-GCM
+DEFAULT_ALG = ALG_AES_GCM if _has_aes_instructions() else ALG_CHACHA20_POLY1305
+
 
 def hybrid_encrypt(data: bytes, user_public_key: bytes):
-    aes_key = Fernet.generate_key()
-    fernet = Fernet(aes_key)
+    aes_key = AESGCM.generate_key(bit_length=256)
+    nonce = os.urandom(_NONCE_SIZE)
 
-    encrypted_data = fernet.encrypt(data)
+    aead = _AEADS[DEFAULT_ALG](aes_key)
+    encrypted_data = bytes((DEFAULT_ALG,)) + nonce + aead.encrypt(nonce, data, None)
     encrypted_aes_key = encrypt_aes_key(aes_key, user_public_key)
 
     return encrypted_data, encrypted_aes_key
 
 
 def hybrid_decrypt(encrypted_data: bytes, encrypted_aes_key: bytes, user_private_key: bytes):
+    aead_cls = _AEADS.get(encrypted_data[0]) if encrypted_data else None
+    if aead_cls is None:
+        raise ValueError("Unknown hybrid encryption algorithm")
+    aes_key = decrypt_aes_key(encrypted_aes_key, user_private_key)
+    nonce, ciphertext = encrypted_data[1:1 + _NONCE_SIZE], encrypted_data[1 + _NONCE_SIZE:]
+
+    return aead_cls(aes_key).decrypt(nonce, ciphertext, None)
+
+
+# ---- Streaming variant for large files ----
+# Layout: <1-byte algorithm tag><2-byte wrapped key length><RSA-OAEP wrapped key><stream>
+# where <stream> is the segmented format from core/crypto.py sealed under the
+# per-file key, so memory use stays at one segment regardless of file size.
+
+def hybrid_encrypt_stream(src, dst, user_public_key: bytes, chunk_size: int = STREAM_SEGMENT_SIZE) -> None:
+    aes_key = AESGCM.generate_key(bit_length=256)
+    encrypted_aes_key = encrypt_aes_key(aes_key, user_public_key)
+    dst.write(bytes((DEFAULT_ALG,)) + len(encrypted_aes_key).to_bytes(2, "big") + encrypted_aes_key)
+
+    encryptor = stream_encryptor(_AEADS[DEFAULT_ALG](aes_key))
+    while chunk := src.read(chunk_size):
+        dst.write(encryptor.update(chunk))
+    dst.write(encryptor.finalize())
+
+
+def hybrid_decrypt_stream(src, dst, user_private_key: bytes, chunk_size: int = STREAM_SEGMENT_SIZE) -> None:
+    header = src.read(3)
+    aead_cls = _AEADS.get(header[0]) if len(header) == 3 else None
+    if aead_cls is None:
+        raise ValueError("Unknown hybrid encryption algorithm")
+    encrypted_aes_key = src.read(int.from_bytes(header[1:], "big"))
     aes_key = decrypt_aes_key(encrypted_aes_key, user_private_key)
-    fernet = Fernet(aes_key)
 
-    return fernet.decrypt(encrypted_data)
+    decryptor = stream_decryptor(aead_cls(aes_key))
+    while chunk := src.read(chunk_size):
+        dst.write(decryptor.update(chunk))
+    dst.write(decryptor.finalize())
@@ -0,0 +1,49 @@
+# Pool of pre-generated RSA-2048 key pairs.
+# Generating a key pair takes ~50-200 ms; a background thread keeps this pool topped up
+# so handlers that give a user their keys (register/search/generate-keys) just pop one.
+# The keys stay RSA-OAEP: the browser client imports these PEMs (spki/pkcs8) into WebCrypto
+# and wraps E2E file keys with RSA-OAEP, so a faster curve would break existing shares.
+import queue
+import threading
+
+from app.core.rsa_utils import generate_rsa_keypair
+
+KEY_POOL_SIZE = 32
+
+_pool: "queue.Queue[tuple]" = queue.Queue(maxsize=KEY_POOL_SIZE)
+_refill_lock = threading.Lock()
+_refill_thread = None
+
+
+def _new_keypair() -> tuple:
+    """(private_pem, public_pem) as str, the form stored on the user."""
+    private_pem, public_pem = generate_rsa_keypair()
+    return private_pem.decode("utf-8"), public_pem.decode("utf-8")
+
+
+def _refill_forever() -> None:
+    # put() blocks while the pool is full, so the thread only works after keys are taken.
+    # OpenSSL releases the GIL during key generation, so request handling is not stalled.
+    while True:
+        _pool.put(_new_keypair())
+
+
+def start_key_pool() -> None:
+    """Start the background refill thread (idempotent). Called on app startup."""
+    global _refill_thread
+    with _refill_lock:
+        if _refill_thread is None:
+            _refill_thread = threading.Thread(target=_refill_forever, name="rsa-key-pool", daemon=True)
+            _refill_thread.start()
+
+
+def get_rsa_keypair() -> tuple:
+    """
+    Pop a pre-generated (private_pem, public_pem) pair.
+    Falls back to generating one inline if the pool is empty (e.g. right after startup);
+    blocking on the refill thread's in-flight key instead measured no faster.
+    """
+    try:
+        return _pool.get_nowait()
+    except queue.Empty:
+        return _new_keypair()
@@ -1,3 +1,6 @@
+import os
+from functools import lru_cache
+
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import serialization, hashes
 
@@ -23,25 +26,34 @@ def generate_rsa_keypair():
     return private_pem, public_pem
 
 
+# One OAEP padding object (and hash instance) serves every wrap/unwrap
+_SHA256 = hashes.SHA256()
+_OAEP = padding.OAEP(
+    mgf=padding.MGF1(algorithm=_SHA256),
+    algorithm=_SHA256,
+    label=None
+)
+
+
+@lru_cache(maxsize=1024)
+def _load_public_key(public_pem: bytes):
+    return serialization.load_pem_public_key(public_pem)
+
+
+def _parse_private_key(private_pem: bytes):
+    return serialization.load_pem_private_key(private_pem, password=None)
+
+
+# Parsed private keys stay in memory for the process lifetime, so caching them is opt-in
+if os.getenv("RSA_CACHE_PRIVATE_KEYS", "").lower() in ("1", "true", "yes"):
+    _load_private_key = lru_cache(maxsize=64)(_parse_private_key)
+else:
+    _load_private_key = _parse_private_key
+
+
 def encrypt_aes_key(aes_key: bytes, public_pem: bytes) -> bytes:
-    public_key = serialization.load_pem_public_key(public_pem)
-    return public_key.encrypt(
-        aes_key,
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None
-        )
-    )
+    return _load_public_key(public_pem).encrypt(aes_key, _OAEP)
 
 
 def decrypt_aes_key(encrypted_key: bytes, private_pem: bytes) -> bytes:
-    private_key = serialization.load_pem_private_key(private_pem, password=None)
-    return private_key.decrypt(
-        encrypted_key,
-        padding.OAEP(
-            mgf=padding.MGF1(algorithm=hashes.SHA256()),
-            algorithm=hashes.SHA256(),
-            label=None
-        )
-    )
+    return _load_private_key(private_pem).decrypt(encrypted_key, _OAEP)
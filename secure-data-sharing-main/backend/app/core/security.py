@@ -1,39 +1,162 @@
+import base64
+import hashlib
+import hmac
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
-from passlib.context import CryptContext
-from jose import jwt, JWTError
-from passlib.exc import UnknownHashError
+import orjson
+from jose import JWTError
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError
 
-# ---- Password hashing (use pbkdf2_sha256 to avoid bcrypt backend issues) ----
-# pbkdf2_sha256 is pure-Python and avoids native bcrypt backend problems
+# ---- Password hashing (pbkdf2_sha256, avoids bcrypt backend issues) ----
+# Hashes are written in passlib's "$pbkdf2-sha256$<rounds>$<salt>$<checksum>"
+# format so rows created through passlib keep verifying. hashlib.pbkdf2_hmac
+# runs the KDF in OpenSSL; calling it directly skips passlib's CryptContext
+# dispatch on every login.
 # If you want to migrate existing bcrypt hashes, re-hash user passwords
 # on next login or provide a password-reset flow.
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+PBKDF2_PREFIX = "$pbkdf2-sha256$"
+PBKDF2_ROUNDS = 29000  # passlib's pbkdf2_sha256 default, so old and new hashes cost the same
+PBKDF2_SALT_SIZE = 16
+
+
+def _ab64_encode(data: bytes) -> str:
+    # passlib's "adapted base64": no padding, '.' instead of '+'
+    return base64.b64encode(data).decode("ascii").rstrip("=").replace("+", ".")
+
+
+def _ab64_decode(data: str) -> bytes:
+    data = data.replace(".", "+")
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+# Successful verifications are remembered for a short while so repeated logins
+# with the same credentials skip the KDF. Entries are keyed on a keyed BLAKE2b
+# digest of the password (never the plaintext) plus the stored hash, so a
+# password change invalidates them on its own. Failures are never cached, so
+# guessing still pays the full KDF cost.
+VERIFY_CACHE_SIZE = 4096
+VERIFY_CACHE_TTL = float(os.getenv("VERIFY_CACHE_TTL_SECONDS", "300"))
+_verify_cache_key = os.urandom(32)
+_verify_cache: "OrderedDict[tuple, float]" = OrderedDict()  # key -> expiry (monotonic)
+_verify_cache_lock = threading.Lock()
+
+
+def _verify_cache_entry(plain_password: str, hashed_password: str) -> tuple:
+    digest = hashlib.blake2b(plain_password.encode("utf-8"), key=_verify_cache_key, digest_size=16).digest()
+    return digest, hashed_password
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    if VERIFY_CACHE_TTL <= 0:
+        return _verify_pbkdf2(plain_password, hashed_password)
+    entry = _verify_cache_entry(plain_password, hashed_password)
+    now = time.monotonic()
+    with _verify_cache_lock:
+        expiry = _verify_cache.get(entry)
+        if expiry is not None:
+            if expiry > now:
+                _verify_cache.move_to_end(entry)
+                return True
+            del _verify_cache[entry]
+    if not _verify_pbkdf2(plain_password, hashed_password):
+        return False
+    with _verify_cache_lock:
+        _verify_cache[entry] = now + VERIFY_CACHE_TTL
+        _verify_cache.move_to_end(entry)
+        if len(_verify_cache) > VERIFY_CACHE_SIZE:
+            _verify_cache.popitem(last=False)
+    return True
+
+
+def _verify_pbkdf2(plain_password: str, hashed_password: str) -> bool:
+    # Anything that is not a pbkdf2_sha256 hash is rejected here;
+    # caller may attempt a legacy verification fallback (e.g. bcrypt)
+    if not hashed_password or not hashed_password.startswith(PBKDF2_PREFIX):
+        return False
     try:
-        return pwd_context.verify(plain_password, hashed_password)
-    except UnknownHashError:
-        # The stored hash uses an unknown scheme for the current context
-        # Caller may attempt a legacy verification fallback (e.g. bcrypt)
+        rounds, salt, checksum = hashed_password[len(PBKDF2_PREFIX):].split("$")
+        salt = _ab64_decode(salt)
+        checksum = _ab64_decode(checksum)
+        derived = hashlib.pbkdf2_hmac("sha256", plain_password.encode("utf-8"), salt, int(rounds), len(checksum))
+    except ValueError:
+        # Malformed hash (bad base64, zero rounds, empty checksum)
         return False
+    return hmac.compare_digest(derived, checksum)
+
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    salt = os.urandom(PBKDF2_SALT_SIZE)
+    checksum = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, PBKDF2_ROUNDS)
+    return f"{PBKDF2_PREFIX}{PBKDF2_ROUNDS}${_ab64_encode(salt)}${_ab64_encode(checksum)}"
 
 # ---- JWT settings ----
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
 
+# HS256 tokens are signed and checked here directly: the header never changes, so it
+# is encoded once, and each token costs one orjson call and one (OpenSSL) HMAC.
+# Tokens stay standard JWTs; the failure modes still raise jose's JWTError types.
+_SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")
+
+
+def _b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64url_decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+_JWT_HEADER = _b64url_encode(orjson.dumps({"alg": ALGORITHM, "typ": "JWT"}))
+
+
+def _sign(signing_input: bytes) -> bytes:
+    return hmac.new(_SECRET_KEY_BYTES, signing_input, hashlib.sha256).digest()
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    to_encode.update({"exp": int(expire.timestamp())})
+    signing_input = _JWT_HEADER + b"." + _b64url_encode(orjson.dumps(to_encode))
+    return (signing_input + b"." + _b64url_encode(_sign(signing_input))).decode("ascii")
 
 def decode_access_token(token: str) -> dict:
     # Raises JWTError on failure; let callers handle
-    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    try:
+        signing_input, _, signature = token.encode("ascii").rpartition(b".")
+        header, _, payload = signing_input.partition(b".")
+        # Our own header is byte-identical every time; only foreign ones need parsing
+        if header != _JWT_HEADER and orjson.loads(_b64url_decode(header)).get("alg") != ALGORITHM:
+            raise JWTError("The specified alg value is not allowed")
+        signature = _b64url_decode(signature)
+    except (ValueError, AttributeError) as e:  # bad ascii/base64/JSON all derive from ValueError
+        raise JWTError("Error decoding token headers.") from e
+
+    if not hmac.compare_digest(_sign(signing_input), signature):
+        raise JWTError("Signature verification failed.")
+
+    try:
+        claims = orjson.loads(_b64url_decode(payload))
+    except ValueError as e:
+        raise JWTError("Invalid payload string") from e
+    if not isinstance(claims, dict):
+        raise JWTError("Invalid payload string: must be a json object")
+
+    now = datetime.now(timezone.utc).timestamp()
+    exp = claims.get("exp")
+    if exp is not None:
+        if not isinstance(exp, (int, float)):
+            raise JWTClaimsError("Expiration Time claim (exp) must be an integer.")
+        if exp < now:
+            raise ExpiredSignatureError("Signature has expired.")
+    nbf = claims.get("nbf")
+    if nbf is not None and isinstance(nbf, (int, float)) and nbf > now:
+        raise JWTClaimsError("The token is not yet valid (nbf)")
+    return claims
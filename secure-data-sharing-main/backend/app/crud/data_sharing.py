@@ -1,5 +1,7 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session, joinedload
 from app.models.data_sharing import DataAccessPermission
+from app.models.file_record import FileRecord
 from app.models.user import User
 
 def grant_access(db: Session, owner_id: int, recipient_id: int, filename: str):
@@ -14,17 +16,65 @@ def grant_access(db: Session, owner_id: int, recipient_id: int, filename: str):
     return permission
 
 def get_files_shared_with_user(db: Session, user_id: int):
-    return db.query(DataAccessPermission).filter(DataAccessPermission.recipient_id == user_id).all()
+    """
+    Permissions granting files to `user_id`, with each file (same JOIN) and its owner
+    (one IN (...) query for all of them) loaded up front instead of lazily per row.
+    """
+    return (
+        db.query(DataAccessPermission)
+        .options(joinedload(DataAccessPermission.file).selectinload(FileRecord.owner))
+        .filter(DataAccessPermission.shared_with_user_id == user_id)
+        .all()
+    )
+
+def get_accessible_file_by_name(db: Session, user_id: int, filename: str):
+    """
+    The FileRecord called `filename` that `user_id` owns or has been shared, in one
+    query (LEFT OUTER JOIN on the recipient's permission). The user's own file wins,
+    then the most recent upload. Returns None if there is no such file.
+    """
+    is_owner = FileRecord.owner_id == user_id
+    return db.query(FileRecord).outerjoin(
+        DataAccessPermission,
+        and_(
+            DataAccessPermission.file_id == FileRecord.id,
+            DataAccessPermission.shared_with_user_id == user_id,
+        ),
+    ).filter(
+        FileRecord.filename == filename,
+        or_(is_owner, DataAccessPermission.id.isnot(None)),
+    ).order_by(is_owner.desc(), FileRecord.upload_date.desc()).first()
+
+
+def get_file_and_permission(db: Session, file_id: int, user_id: int):
+    """
+    Fetch a FileRecord and the DataAccessPermission granting it to `user_id` in one
+    LEFT OUTER JOIN. Returns (file_record, permission); either may be None.
+    """
+    row = db.query(FileRecord, DataAccessPermission).outerjoin(
+        DataAccessPermission,
+        and_(
+            DataAccessPermission.file_id == FileRecord.id,
+            DataAccessPermission.shared_with_user_id == user_id,
+        ),
+    ).filter(FileRecord.id == file_id).first()
+    return (row[0], row[1]) if row else (None, None)
+
 
-def check_access_permission(db: Session, user_id: int, owner_username: str, filename: str):
-    owner = db.query(User).filter(User.username == owner_username).first()
-    if not owner:
-        return False
-    
-    permission = db.query(DataAccessPermission).filter(
-        DataAccessPermission.owner_id == owner.id,
-        DataAccessPermission.recipient_id == user_id,
-        DataAccessPermission.filename == filename
-    ).first()
-    
-    return permission is not None
+def get_file_user_and_permission(db: Session, file_id: int, username: str):
+    """
+    Fetch a FileRecord, the User called `username` and the permission sharing the
+    file with that user in a single statement (both LEFT OUTER JOINs).
+    Returns (file_record, user, permission); any of them may be None, and user and
+    permission are only looked up when the file exists.
+    """
+    row = db.query(FileRecord, User, DataAccessPermission).select_from(FileRecord).outerjoin(
+        User, User.username == username,
+    ).outerjoin(
+        DataAccessPermission,
+        and_(
+            DataAccessPermission.file_id == FileRecord.id,
+            DataAccessPermission.shared_with_user_id == User.id,
+        ),
+    ).filter(FileRecord.id == file_id).first()
+    return (row[0], row[1], row[2]) if row else (None, None, None)
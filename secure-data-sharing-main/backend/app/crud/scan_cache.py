@@ -0,0 +1,29 @@
+# app/crud/scan_cache.py
+import json
+from datetime import datetime
+from sqlalchemy.orm import Session
+from app.models.scan_cache import ScanCache
+from app.core.scanner import CONTENT_SCANNER_VERSION, content_extension
+
+def get_cached_scan(db: Session, sha256: str, filename: str):
+    """
+    Return the cached content scan result for this content and file type, or None if it
+    was never scanned or was scanned by a different scanner version.
+    """
+    entry = db.get(ScanCache, (sha256, content_extension(filename)))
+    if entry is None or entry.engine_version != CONTENT_SCANNER_VERSION:
+        return None
+    return json.loads(entry.result_json)
+
+def save_scan(db: Session, filename: str, content_result: dict):
+    """
+    Store a content scan result under its file hash (replacing any stale entry).
+    The caller commits.
+    """
+    db.merge(ScanCache(
+        sha256=content_result["file_hash"],
+        extension=content_extension(filename),
+        engine_version=CONTENT_SCANNER_VERSION,
+        result_json=json.dumps(content_result),
+        scanned_at=datetime.utcnow(),
+    ))
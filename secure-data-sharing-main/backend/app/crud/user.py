@@ -8,6 +8,7 @@ from passlib.context import CryptContext
 
 # CryptContext for legacy bcrypt hashes (do not make this default)
 legacy_pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
+LEGACY_BCRYPT_PREFIXES = ('$2a$', '$2b$', '$2y$')
 
 
 def get_user_by_username(db: Session, username: str):
@@ -30,25 +31,24 @@ def authenticate_user(db: Session, username: str, password: str):
     user = get_user_by_username(db, username)
     if not user:
         return None
-    # Try current scheme first
-    if verify_password(password, user.hashed_password):
-        return user
+    # Exactly one KDF runs per attempt: the stored hash's own scheme decides which
+    if not (user.hashed_password or "").startswith(LEGACY_BCRYPT_PREFIXES):
+        return user if verify_password(password, user.hashed_password) else None
 
-    # Legacy bcrypt fallback: if stored hash looks like bcrypt, try verifying
-    # with a bcrypt-only context, then re-hash into the current scheme.
+    # Legacy bcrypt hash: verify with a bcrypt-only context, then re-hash into the
+    # current scheme. migrate_db.py reports how many accounts are still on bcrypt;
+    # once that reaches zero this branch (and the passlib dependency) can go.
     try:
-        if user.hashed_password and user.hashed_password.startswith(('$2a$','$2b$','$2y$')):
-            if legacy_pwd_ctx.verify(password, user.hashed_password):
-                # re-hash using current scheme and update DB
-                new_hash = get_password_hash(password)
-                db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
-                db.commit()
-                # refresh object
-                db.refresh(user)
-                return user
+        if legacy_pwd_ctx.verify(password, user.hashed_password):
+            # re-hash using current scheme and update DB
+            new_hash = get_password_hash(password)
+            db.execute(update(User).where(User.id == user.id).values(hashed_password=new_hash))
+            db.commit()
+            # refresh object
+            db.refresh(user)
+            return user
     except Exception:
         # ignore fallback errors and treat as failed auth
         pass
 
     return None
-    return user
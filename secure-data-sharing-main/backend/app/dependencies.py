@@ -3,19 +3,15 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
+from jose import JWTError
+from app.core.security import decode_access_token
 from app.database import get_db
 from app.models.user import User
 from app.crud.user import get_user_by_username
-import os
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
-# Secret + algo (must match security.py)
-SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me") # ✅ CORRECT KEY
-ALGORITHM = "HS256"
-
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     """
     Decodes the JWT token to get the current user. This is the single source of truth for authentication.
@@ -26,7 +22,7 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)  # same key and algorithm as token issuance
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
@@ -1,10 +1,10 @@
 # Federated Learning Server
 import numpy as np
-import pickle
+import io
 import os
 from typing import Dict, List, Optional
 from datetime import datetime
-from .aggregator import FedAvgAggregator, ClientUpdate
+from .aggregator import FedAvgAggregator
 from .config import NUM_FEATURES, MIN_CLIENTS_FOR_ROUND, MAX_ROUNDS
 
 
@@ -33,7 +33,7 @@ class FederatedServer:
         self.round_participants: Dict[int, List[str]] = {}
         
         # Aggregator
-        self.aggregator = FedAvgAggregator()
+        self.aggregator = FedAvgAggregator(num_features)
         
         # Training history
         self.training_history: List[dict] = []
@@ -76,9 +76,9 @@ class FederatedServer:
         return False
     
     def get_global_model(self) -> dict:
-        """Return the current global model parameters."""
+        """Return the current global model parameters (weights as the live ndarray, not a list)."""
         return {
-            "weights": self.global_weights.tolist(),
+            "weights": self.global_weights,
             "bias": float(self.global_bias),
             "round": self.current_round,
             "num_features": self.num_features
@@ -123,18 +123,8 @@ class FederatedServer:
         if not self.is_training:
             return {"status": "error", "message": "No active training round"}
         
-        # Create client update
-        update = ClientUpdate(
-            client_id=client_id,
-            weights=np.array(weights),
-            bias=bias,
-            num_samples=num_samples,
-            round_number=self.current_round,
-            local_accuracy=local_accuracy
-        )
-        
-        # Add to aggregator
-        self.aggregator.add_client_update(update)
+        # Written straight into the aggregator's row for this client
+        self.aggregator.add_update(client_id, weights, bias, num_samples, local_accuracy)
         
         # Track participation
         if client_id not in self.round_participants.get(self.current_round, []):
@@ -171,7 +161,7 @@ class FederatedServer:
         aggregation_result = self.aggregator.aggregate()
         
         # Update global model
-        self.global_weights = np.array(aggregation_result["weights"])
+        self.global_weights = aggregation_result["weights"]
         self.global_bias = aggregation_result["bias"]
         
         # Record history
@@ -199,41 +189,54 @@ class FederatedServer:
         }
     
     def _save_global_model(self) -> str:
-        """Save the current global model to disk."""
-        model_data = {
-            "weights": self.global_weights,
-            "bias": self.global_bias,
-            "round": self.current_round,
-            "num_features": self.num_features,
-            "saved_at": datetime.utcnow().isoformat()
-        }
+        """Save the current global model to disk (.npz: raw arrays, no pickle)."""
+        # Serialize once; the same bytes go to the per-round file and to "latest"
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            weights=self.global_weights,
+            bias=np.float64(self.global_bias),
+            round=np.int64(self.current_round),
+            num_features=np.int64(self.num_features),
+            saved_at=np.str_(datetime.utcnow().isoformat())
+        )
+        payload = buffer.getvalue()
         
-        filepath = os.path.join(self.model_dir, f"federated_global_model_round_{self.current_round}.pkl")
+        filepath = os.path.join(self.model_dir, f"federated_global_model_round_{self.current_round}.npz")
         with open(filepath, "wb") as f:
-            pickle.dump(model_data, f)
+            f.write(payload)
         
-        # Also save as latest
-        latest_path = os.path.join(self.model_dir, "federated_global_model_latest.pkl")
-        with open(latest_path, "wb") as f:
-            pickle.dump(model_data, f)
+        # Also save as latest; written aside and renamed so readers never see a partial file
+        latest_path = os.path.join(self.model_dir, "federated_global_model_latest.npz")
+        tmp_path = latest_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, latest_path)
         
         return filepath
     
     def load_global_model(self, filepath: Optional[str] = None) -> dict:
         """Load a global model from disk."""
         if filepath is None:
-            filepath = os.path.join(self.model_dir, "federated_global_model_latest.pkl")
+            filepath = os.path.join(self.model_dir, "federated_global_model_latest.npz")
         
         if not os.path.exists(filepath):
             return {"status": "error", "message": "Model file not found"}
         
-        with open(filepath, "rb") as f:
-            model_data = pickle.load(f)
+        # allow_pickle=False: a model file can only ever yield plain arrays
+        try:
+            with np.load(filepath, allow_pickle=False) as model_data:
+                weights = model_data["weights"]
+                bias = float(model_data["bias"])
+                current_round = int(model_data["round"]) if "round" in model_data else 0
+                num_features = int(model_data["num_features"]) if "num_features" in model_data else self.num_features
+        except (OSError, ValueError, KeyError):
+            return {"status": "error", "message": "Not a valid model file"}
         
-        self.global_weights = model_data["weights"]
-        self.global_bias = model_data["bias"]
-        self.current_round = model_data.get("round", 0)
-        self.num_features = model_data.get("num_features", self.num_features)
+        self.global_weights = weights
+        self.global_bias = bias
+        self.current_round = current_round
+        self.num_features = num_features
         
         return {
             "status": "loaded",
@@ -257,16 +260,34 @@ class FederatedServer:
         """Get the full training history."""
         return self.training_history
     
+    def _logits(self, X: np.ndarray) -> np.ndarray:
+        # einsum reads float32 input in place; np.dot would upcast a float64 copy of X first
+        z = np.asarray(np.einsum("...j,j->...", X, self.global_weights, dtype=np.float64))
+        z += self.global_bias
+        return z
+    
+    @staticmethod
+    def _sigmoid_(z: np.ndarray) -> np.ndarray:
+        """In-place logistic function: one buffer instead of a temporary per operator."""
+        np.negative(z, out=z)
+        np.exp(z, out=z)
+        z += 1
+        return np.reciprocal(z, out=z)
+    
     def predict(self, X: np.ndarray) -> np.ndarray:
         """Make predictions using the global model."""
-        z = np.dot(X, self.global_weights) + self.global_bias
-        probabilities = 1 / (1 + np.exp(-z))
-        return (probabilities >= 0.5).astype(int)
+        # sigmoid(z) >= 0.5 exactly when z >= 0, so classes need no exp at all
+        return (self._logits(X) >= 0).astype(int)
     
     def predict_proba(self, X: np.ndarray) -> np.ndarray:
         """Get prediction probabilities using the global model."""
-        z = np.dot(X, self.global_weights) + self.global_bias
-        return 1 / (1 + np.exp(-z))
+        return self._sigmoid_(self._logits(X))
+    
+    def predict_both(self, X: np.ndarray):
+        """Return (classes, probabilities) from a single forward pass of the global model."""
+        z = self._logits(X)
+        classes = (z >= 0).astype(np.int8)
+        return classes, self._sigmoid_(z)
 
 
 # Global server instance
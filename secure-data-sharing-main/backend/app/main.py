@@ -1,21 +1,35 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
+from sqlalchemy import inspect
+from app.database import engine, Base, warm_up_pool
+from app.core.responses import ORJSONResponse
+from app.core.key_pool import start_key_pool
+from app.federated.aggregator import warm_up_fedavg
 from app.api.endpoints import users, auth, me, files, ml, federated
 
 # Initialize FastAPI app FIRST
 app = FastAPI(
     title="Mirai Secure ML System",
     version="0.1.0",
-    description="A secure system for file handling and ML model training/management."
+    description="A secure system for file handling and ML model training/management.",
+    default_response_class=ORJSONResponse,
 )
 
 # NOW you can use the 'app' variable
 # Create database tables on startup
 # This ensures that your tables are created before the app starts listening for requests.
+# One table-name query decides whether anything is missing; create_all (which checks
+# every table separately) only runs on a fresh or incomplete database.
+# Column changes to existing tables still go through migrate_db.py.
 @app.on_event("startup")
 def on_startup():
-    Base.metadata.create_all(bind=engine)
+    if not set(Base.metadata.tables).issubset(inspect(engine).get_table_names()):
+        Base.metadata.create_all(bind=engine)
+    warm_up_pool()
+    # Pre-generate RSA key pairs in the background for users who still need keys
+    start_key_pool()
+    # JIT-load the FedAvg kernel now rather than inside the first /round/aggregate
+    warm_up_fedavg()
 
 
 # --- CORS Middleware ---
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, desc
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -16,8 +16,21 @@ class FileRecord(Base):
     file_type = Column(String)
     size_bytes = Column(Integer)
     upload_date = Column(DateTime, default=datetime.utcnow)
+
+    # "server" = encrypted by the server at upload, "e2e" = client-side encrypted.
+    # NULL for files uploaded before this column existed.
+    encryption_mode = Column(String, nullable=True)
+
+    # SHA-256 of the plaintext from the upload-time content scan (server-encrypted files only);
+    # lets deep scans hit the scan cache without reading the file
+    content_sha256 = Column(String, nullable=True)
     
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="files")
     
     shared_with = relationship("DataAccessPermission", back_populates="file", cascade="all, delete-orphan")
+
+    # /files/list filters by owner and sorts newest-first; this index serves both
+    __table_args__ = (
+        Index("ix_files_owner_date", "owner_id", desc("upload_date")),
+    )
@@ -0,0 +1,18 @@
+# app/models/scan_cache.py
+from sqlalchemy import Column, String, Text, DateTime
+from datetime import datetime
+from app.database import Base
+
+class ScanCache(Base):
+    """
+    Content scan results keyed by the SHA-256 of the plaintext, so identical content is
+    scanned once. The extension is part of the key: signature and URL checks depend on it.
+    """
+    __tablename__ = "scan_cache"
+
+    sha256 = Column(String, primary_key=True)
+    extension = Column(String, primary_key=True)
+    # Results from an older scanner version are treated as a miss
+    engine_version = Column(String, nullable=False)
+    result_json = Column(Text, nullable=False)
+    scanned_at = Column(DateTime, default=datetime.utcnow)
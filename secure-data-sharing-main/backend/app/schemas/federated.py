@@ -80,6 +80,11 @@ class TrainingHistoryResponse(BaseModel):
     history: List[RoundHistoryItem]
 
 
+class SnapshotResponse(BaseModel):
+    global_model: GlobalModelResponse
+    history: Optional[List[RoundHistoryItem]] = None
+
+
 # --- Prediction ---
 class PredictionRequest(BaseModel):
     data: List[List[float]] = Field(..., description="2D array of feature vectors")
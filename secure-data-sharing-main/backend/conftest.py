@@ -0,0 +1,45 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, get_db
+from app.main import app
+
+TEST_USERNAME = "test_user"
+TEST_PASSWORD = "test-password"
+
+
+# One client (and one app startup) shared by every test in the session. Requests use a
+# fresh SQLite file instead of whatever app.db is in the working directory.
+@pytest.fixture(scope="session")
+def client(tmp_path_factory):
+    engine = create_engine(
+        f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(bind=engine)
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def override_get_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    try:
+        with TestClient(app) as c:
+            yield c
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def test_user(client):
+    """A registered user in the test database, as (username, password)."""
+    resp = client.post('/users/register', json={'username': TEST_USERNAME, 'password': TEST_PASSWORD})
+    assert resp.status_code == 200, resp.text
+    return TEST_USERNAME, TEST_PASSWORD
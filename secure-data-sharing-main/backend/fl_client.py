@@ -3,12 +3,17 @@
 # Each client trains locally and sends only model updates to the server.
 
 import numpy as np
+import orjson
 import requests
-from typing import Optional, List, Tuple
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Tuple, Union
+from scipy.special import expit
 from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import accuracy_score
-import json
+from fast_lr import LogisticRegressionLBFGS
+
+
+_RAW_HEADERS = {"Content-Type": "application/octet-stream"}
 
 
 class FederatedClient:
@@ -17,27 +22,37 @@ class FederatedClient:
     Handles local training and communication with FL server.
     """
     
-    def __init__(self, client_id: str, server_url: str = "http://localhost:8000"):
+    def __init__(self, client_id: str, server_url: str = "http://localhost:8000",
+                 session: Optional[requests.Session] = None):
         """
         Initialize the federated client.
         
         Args:
             client_id: Unique identifier for this client
             server_url: URL of the federated learning server
+            session: Optional shared HTTP session (keep-alive); one is created if omitted
         """
         self.client_id = client_id
         self.server_url = server_url.rstrip("/")
         self.fl_endpoint = f"{self.server_url}/federated"
+        # Per-round endpoints, formatted once
+        self._model_url = f"{self.fl_endpoint}/model"
+        self._update_url = f"{self.fl_endpoint}/update/raw"
+        self.session = session or requests.Session()
         
         # Local model
         self.model: Optional[LogisticRegression] = None
-        self.scaler: Optional[StandardScaler] = None
         
         # Local data (never sent to server)
         self.X_train: Optional[np.ndarray] = None
         self.y_train: Optional[np.ndarray] = None
         self.X_test: Optional[np.ndarray] = None
         self.y_test: Optional[np.ndarray] = None
+        self.solver: Optional[LogisticRegressionLBFGS] = None
+        
+        # Logits of the local evaluation data under the current model; reset whenever
+        # the local data or the model parameters are replaced
+        self._local_logits: Optional[np.ndarray] = None
         
         # Model parameters from server
         self.num_features: Optional[int] = None
@@ -48,7 +63,7 @@ class FederatedClient:
     
     def register(self, metadata: Optional[dict] = None) -> dict:
         """Register this client with the FL server."""
-        response = requests.post(
+        response = self.session.post(
             f"{self.fl_endpoint}/register",
             json={"client_id": self.client_id, "metadata": metadata}
         )
@@ -60,16 +75,18 @@ class FederatedClient:
     
     def unregister(self) -> dict:
         """Unregister this client from the FL server."""
-        response = requests.delete(f"{self.fl_endpoint}/unregister/{self.client_id}")
+        response = self.session.delete(f"{self.fl_endpoint}/unregister/{self.client_id}")
         response.raise_for_status()
         self.is_registered = False
         return response.json()
     
     def get_global_model(self) -> dict:
         """Fetch the current global model from the server."""
-        response = requests.get(f"{self.fl_endpoint}/model")
+        response = self.session.get(self._model_url)
         response.raise_for_status()
-        model_data = response.json()
+        # Weight-carrying payloads are decoded with orjson (several times faster than
+        # requests' stdlib json on long float arrays); small status replies keep .json()
+        model_data = orjson.loads(response.content)
         
         # Update local state
         self.num_features = model_data["num_features"]
@@ -89,21 +106,14 @@ class FederatedClient:
         )
         
         # Set the model parameters from global model
-        # LogisticRegression needs to be "fitted" first to have coef_ and intercept_
-        # We'll do a dummy fit and then override
+        # predict() only needs the fitted attributes, so set them directly
+        # instead of running a dummy fit first
         num_features = model_data["num_features"]
-        
-        # Create dummy data for initialization
-        dummy_X = np.zeros((2, num_features))
-        dummy_X[0, 0] = 1
-        dummy_y = np.array([0, 1])
-        
-        # Fit on dummy data
-        self.model.fit(dummy_X, dummy_y)
-        
-        # Override with global model parameters
-        self.model.coef_ = np.array([model_data["weights"]])
-        self.model.intercept_ = np.array([model_data["bias"]])
+        self.model.coef_ = np.asarray([model_data["weights"]], dtype=np.float64)
+        self.model.intercept_ = np.asarray([model_data["bias"]], dtype=np.float64)
+        self.model.classes_ = np.array([0, 1])
+        self.model.n_features_in_ = num_features
+        self._local_logits = None
     
     def set_local_data(self, X_train: np.ndarray, y_train: np.ndarray,
                        X_test: Optional[np.ndarray] = None, 
@@ -117,20 +127,40 @@ class FederatedClient:
             y_train: Training labels
             X_test: Optional test features
             y_test: Optional test labels
+        
+        Features are kept as float32, which halves the memory traffic of every
+        pass over them; float32 arrays (including np.memmap, see
+        set_local_data_from_path) are used as-is, not copied.
         """
-        self.X_train = np.array(X_train)
-        self.y_train = np.array(y_train)
+        self.X_train = np.asarray(X_train, dtype=np.float32)
+        self.y_train = np.asarray(y_train)
+        self.solver = LogisticRegressionLBFGS(self.X_train, self.y_train)
+        self._local_logits = None
         
         if X_test is not None:
-            self.X_test = np.array(X_test)
+            self.X_test = np.asarray(X_test, dtype=np.float32)
         if y_test is not None:
-            self.y_test = np.array(y_test)
+            self.y_test = np.asarray(y_test)
         
         # Update num_features if not set
         if self.num_features is None:
             self.num_features = self.X_train.shape[1]
     
-    def train_local(self, epochs: int = 1) -> Tuple[List[float], float, float]:
+    def set_local_data_from_path(self, X_train_path: str, y_train_path: str,
+                                 X_test_path: Optional[str] = None,
+                                 y_test_path: Optional[str] = None) -> None:
+        """
+        Set the local data from .npy files, memory-mapped read-only.
+        The OS page cache backs the arrays, so datasets larger than RAM work
+        and nothing is duplicated in process memory.
+        """
+        def load(path: Optional[str]) -> Optional[np.ndarray]:
+            return None if path is None else np.load(path, mmap_mode="r")
+        
+        self.set_local_data(load(X_train_path), load(y_train_path),
+                            load(X_test_path), load(y_test_path))
+    
+    def train_local(self, epochs: int = 1) -> Tuple[np.ndarray, float, float]:
         """
         Train the model locally on client's data.
         
@@ -138,7 +168,8 @@ class FederatedClient:
             epochs: Number of local training epochs
             
         Returns:
-            Tuple of (weights, bias, local_accuracy)
+            Tuple of (weights, bias, local_accuracy); weights is an ndarray
+            (call .tolist() if a plain list is needed)
         """
         if self.X_train is None or self.y_train is None:
             raise ValueError("Local data not set. Call set_local_data first.")
@@ -146,51 +177,74 @@ class FederatedClient:
         if self.model is None:
             raise ValueError("Model not initialized. Call get_global_model first.")
         
-        # Train locally
-        self.model.max_iter = epochs * 100  # Increase iterations for more epochs
-        self.model.fit(self.X_train, self.y_train)
-        
-        # Get updated parameters
-        weights = self.model.coef_[0].tolist()
-        bias = float(self.model.intercept_[0])
+        # Train locally: same objective as LogisticRegression(solver='lbfgs'), warm-started
+        # from the global model, but without sklearn's per-fit validation and setup
+        weights, bias = self.solver.fit(
+            self.model.coef_[0], self.model.intercept_[0],
+            max_iter=epochs * 100  # Increase iterations for more epochs
+        )
+        self.model.coef_ = weights[np.newaxis, :]
+        self.model.intercept_ = np.array([bias])
+        self._local_logits = None
         
         # Calculate local accuracy
         local_accuracy = self._evaluate_local()
         
         return weights, bias, local_accuracy
     
+    def _local_eval_data(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Local test data if set, else the training data."""
+        if self.X_test is not None and self.y_test is not None:
+            return self.X_test, self.y_test
+        if self.X_train is None:
+            raise ValueError("Local data not set. Call set_local_data first.")
+        return self.X_train, self.y_train
+    
+    def _local_eval_logits(self) -> np.ndarray:
+        """Logits of the local evaluation data, computed once per model/data."""
+        if self._local_logits is None:
+            self._local_logits = self._decision_function(self._local_eval_data()[0])
+        return self._local_logits
+    
     def _evaluate_local(self) -> float:
         """Evaluate model on local test data or training data."""
-        if self.X_test is not None and self.y_test is not None:
-            predictions = self.model.predict(self.X_test)
-            return accuracy_score(self.y_test, predictions)
-        else:
-            predictions = self.model.predict(self.X_train)
-            return accuracy_score(self.y_train, predictions)
+        y = self._local_eval_data()[1]
+        return float(np.mean((self._local_eval_logits() > 0) == y))
+    
+    def _decision_function(self, X: np.ndarray) -> np.ndarray:
+        """Logits X @ w + b; binary LR predicts class 1 exactly where they are > 0."""
+        return X @ self.model.coef_[0].astype(X.dtype, copy=False) + self.model.intercept_[0]
     
-    def submit_update(self, weights: List[float], bias: float, 
+    def submit_update(self, weights: Union[np.ndarray, List[float]], bias: float, 
                       local_accuracy: Optional[float] = None) -> dict:
         """
         Submit model update to the FL server.
         Only model weights are sent, NOT the data.
         
         Args:
-            weights: Updated model weights
+            weights: Updated model weights (ndarray or list)
             bias: Updated model bias
             local_accuracy: Optional local accuracy metric
         """
         if self.X_train is None:
             raise ValueError("Local data not set")
         
-        payload = {
+        params = {
             "client_id": self.client_id,
-            "weights": weights,
             "bias": bias,
             "num_samples": len(self.X_train),
-            "local_accuracy": local_accuracy
         }
-        
-        response = requests.post(f"{self.fl_endpoint}/update", json=payload)
+        if local_accuracy is not None:
+            params["local_accuracy"] = local_accuracy
+        
+        # Weights go as raw little-endian float32 (/update/raw): half the bytes of
+        # float64 and no JSON float formatting/parsing on either end
+        response = self.session.post(
+            self._update_url,
+            params=params,
+            data=np.asarray(weights, dtype="<f4").tobytes(),
+            headers=_RAW_HEADERS
+        )
         response.raise_for_status()
         return response.json()
     
@@ -224,21 +278,23 @@ class FederatedClient:
     
     def get_server_status(self) -> dict:
         """Get the current status of the FL server."""
-        response = requests.get(f"{self.fl_endpoint}/status")
+        response = self.session.get(f"{self.fl_endpoint}/status")
         response.raise_for_status()
         return response.json()
     
-    def predict(self, X: np.ndarray) -> np.ndarray:
-        """Make predictions using the local model."""
+    def _logits(self, X: Optional[np.ndarray]) -> np.ndarray:
         if self.model is None:
             raise ValueError("Model not initialized")
-        return self.model.predict(X)
+        # X=None reuses the logits train_local already computed for its local evaluation
+        return self._local_eval_logits() if X is None else self._decision_function(np.asarray(X))
     
-    def predict_proba(self, X: np.ndarray) -> np.ndarray:
-        """Get prediction probabilities using the local model."""
-        if self.model is None:
-            raise ValueError("Model not initialized")
-        return self.model.predict_proba(X)[:, 1]
+    def predict(self, X: Optional[np.ndarray] = None) -> np.ndarray:
+        """Make predictions using the local model (on the local evaluation data if X is None)."""
+        return (self._logits(X) > 0).astype(int)
+    
+    def predict_proba(self, X: Optional[np.ndarray] = None) -> np.ndarray:
+        """Get prediction probabilities using the local model (local evaluation data if X is None)."""
+        return expit(self._logits(X))
 
 
 # --- Utility Functions for Running Clients ---
@@ -252,10 +308,13 @@ def create_sample_data(num_samples: int, num_features: int,
     if random_seed is not None:
         np.random.seed(random_seed)
     
-    X = np.random.randn(num_samples, num_features)
+    # float32 halves the bytes every later pass over X (training, prediction) moves
+    X = np.random.randn(num_samples, num_features).astype(np.float32)
     # Create labels based on a simple rule
-    true_weights = np.random.randn(num_features)
-    y = (np.dot(X, true_weights) > 0).astype(int)
+    true_weights = np.random.randn(num_features).astype(np.float32)
+    scores = np.empty(num_samples, dtype=np.float32)
+    np.dot(X, true_weights, out=scores)
+    y = (scores > 0).view(np.int8)  # reinterprets the bool mask, no second array
     
     return X, y
 
@@ -272,13 +331,17 @@ def run_federated_round(clients: List[FederatedClient], epochs: int = 1) -> None
     print(f"Starting Federated Learning Round")
     print(f"{'='*50}")
     
-    # Each client participates
-    for client in clients:
+    def participate(client: FederatedClient) -> str:
         try:
-            result = client.participate_in_round(epochs)
-            print(f"  Client {client.client_id}: {result['status']}")
+            return client.participate_in_round(epochs)["status"]
         except Exception as e:
-            print(f"  Client {client.client_id}: Error - {str(e)}")
+            return f"Error - {str(e)}"
+    
+    # Each client participates; they are independent, so run them concurrently
+    with ThreadPoolExecutor(max_workers=max(len(clients), 1)) as pool:
+        outcomes = list(pool.map(participate, clients))
+    for client, outcome in zip(clients, outcomes):
+        print(f"  Client {client.client_id}: {outcome}")
     
     print(f"{'='*50}\n")
 
@@ -297,9 +360,13 @@ if __name__ == "__main__":
     NUM_CLIENTS = 3
     NUM_ROUNDS = 5
     
+    # One keep-alive session shared by the driver and every client
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_maxsize=max(NUM_CLIENTS, 10)))
+    
     # Step 1: Initialize the server model
     print("Initializing server model...")
-    response = requests.post(
+    response = session.post(
         f"{SERVER_URL}/federated/init",
         json={"num_features": NUM_FEATURES}
     )
@@ -310,7 +377,8 @@ if __name__ == "__main__":
     for i in range(NUM_CLIENTS):
         client = FederatedClient(
             client_id=f"client_{i+1}",
-            server_url=SERVER_URL
+            server_url=SERVER_URL,
+            session=session
         )
         
         # Register client
@@ -342,7 +410,7 @@ if __name__ == "__main__":
         print(f"{'#'*50}")
         
         # Start the round
-        response = requests.post(f"{SERVER_URL}/federated/round/start")
+        response = session.post(f"{SERVER_URL}/federated/round/start")
         start_result = response.json()
         print(f"Round started: {start_result.get('status', 'unknown')}")
         
@@ -354,7 +422,7 @@ if __name__ == "__main__":
         run_federated_round(clients, epochs=1)
         
         # Aggregate the round
-        response = requests.post(f"{SERVER_URL}/federated/round/aggregate")
+        response = session.post(f"{SERVER_URL}/federated/round/aggregate")
         agg_result = response.json()
         print(f"Aggregation result: {agg_result.get('status', 'unknown')}")
         if "aggregation_result" in agg_result:
@@ -370,16 +438,17 @@ if __name__ == "__main__":
     print("FINAL RESULTS")
     print("="*50)
     
-    response = requests.get(f"{SERVER_URL}/federated/history")
-    history = response.json()
-    print(f"\nTraining History ({len(history['history'])} rounds):")
-    for item in history['history']:
+    # Final model and history in one round-trip
+    response = session.get(f"{SERVER_URL}/federated/snapshot")
+    snapshot = orjson.loads(response.content)
+    history = snapshot["history"]
+    print(f"\nTraining History ({len(history)} rounds):")
+    for item in history:
         print(f"  Round {item['round']}: {item['num_clients']} clients, "
               f"{item['total_samples']} samples, "
               f"avg accuracy: {item.get('avg_local_accuracy', 'N/A')}")
     
-    response = requests.get(f"{SERVER_URL}/federated/model")
-    final_model = response.json()
+    final_model = snapshot["global_model"]
     print(f"\nFinal Global Model:")
     print(f"  - Round: {final_model['round']}")
     print(f"  - Features: {final_model['num_features']}")
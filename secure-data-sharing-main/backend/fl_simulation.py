@@ -1,65 +1,145 @@
 # Multi-Client Federated Learning Simulation
 # Simulates multiple clients with different local datasets
 
+import math
+import os
 import numpy as np
+import orjson
 import requests
 import time
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple, Union
+from requests.adapters import HTTPAdapter
 from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
+from fast_lr import LogisticRegressionLBFGS
+
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; labels are generated with NumPy instead
+    njit = None
 
 SERVER_URL = "http://localhost:8000"
 FL_ENDPOINT = f"{SERVER_URL}/federated"
 
+# Endpoint URLs and the binary upload headers, built once instead of per request
+INIT_URL = f"{FL_ENDPOINT}/init"
+REGISTER_URL = f"{FL_ENDPOINT}/register"
+START_URL = f"{FL_ENDPOINT}/round/start"
+UPDATE_RAW_URL = f"{FL_ENDPOINT}/update/raw"
+AGG_URL = f"{FL_ENDPOINT}/round/aggregate"
+MODEL_URL = f"{FL_ENDPOINT}/model"
+RAW_HEADERS = {"Content-Type": "application/octet-stream"}
+
+# One keep-alive session for every request; the pool is sized so concurrent
+# client submissions each get their own connection instead of reconnecting
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=32))
+
+
+def _accuracy(X: np.ndarray, y: np.ndarray, weights, bias: float) -> float:
+    """Accuracy of a binary logistic model: predicting 1 is just X @ w + b > 0."""
+    scores = X @ np.asarray(weights, dtype=X.dtype) + bias
+    return float(np.mean((scores > 0) == y))
+
 
 class SimulatedClient:
     """Simulated FL client for testing."""
     
     def __init__(self, client_id: str, X_train: np.ndarray, y_train: np.ndarray,
-                 X_test: np.ndarray, y_test: np.ndarray):
+                 X_test: np.ndarray, y_test: np.ndarray, row_view: np.ndarray = None):
         self.client_id = client_id
         self.X_train = X_train
         self.y_train = y_train
         self.X_test = X_test
         self.y_test = y_test
         self.model = None
+        self.unregister_url = f"{FL_ENDPOINT}/unregister/{client_id}"
+        # Solver bound to this client's data once, refit from the global model each round
+        self.solver = LogisticRegressionLBFGS(X_train, y_train)
+        # This client's [weights..., bias] row, rewritten in place every round; normally a
+        # row of the simulation's shared (num_clients, num_features + 1) float32 matrix
+        if row_view is None:
+            row_view = np.empty(X_train.shape[1] + 1, dtype=np.float32)
+        self.row_view = row_view
     
-    def initialize_model(self, weights: List[float], bias: float):
+    def initialize_model(self, weights: Union[np.ndarray, List[float]], bias: float):
         """Initialize local model with global weights."""
         num_features = len(weights)
         
-        # Create and fit a dummy model to initialize
+        # Set the fitted attributes predict() reads directly; no dummy fit needed
         self.model = LogisticRegression(warm_start=True, max_iter=100)
-        dummy_X = np.zeros((2, num_features))
-        dummy_X[0, 0] = 1
-        dummy_y = np.array([0, 1])
-        self.model.fit(dummy_X, dummy_y)
-        
-        # Set global weights
-        self.model.coef_ = np.array([weights])
-        self.model.intercept_ = np.array([bias])
+        self.model.coef_ = np.asarray([weights], dtype=np.float64)
+        self.model.intercept_ = np.asarray([bias], dtype=np.float64)
+        self.model.classes_ = np.array([0, 1])
+        self.model.n_features_in_ = num_features
     
-    def train_local(self, epochs: int = 1) -> Tuple[List[float], float, float]:
-        """Train locally and return updated weights."""
-        self.model.max_iter = epochs * 100
-        self.model.fit(self.X_train, self.y_train)
+    def train_local(self, epochs: int = 1) -> Tuple[np.ndarray, float, float]:
+        """Train locally and return updated weights (a view into row_view)."""
+        coef, bias = self.solver.fit(self.model.coef_[0], self.model.intercept_[0],
+                                     max_iter=epochs * 100)
+        # The sklearn model is only kept for predict()
+        self.model.coef_[0] = coef
+        self.model.intercept_[0] = bias
         
         # Get updated weights
-        weights = self.model.coef_[0].tolist()
-        bias = float(self.model.intercept_[0])
+        self.row_view[:-1] = coef
+        self.row_view[-1] = bias
+        weights = self.row_view[:-1]
         
         # Evaluate
-        predictions = self.model.predict(self.X_test)
-        accuracy = accuracy_score(self.y_test, predictions)
+        accuracy = _accuracy(self.X_test, self.y_test, coef, bias)
         
         return weights, bias, accuracy
     
-    def evaluate_global(self, weights: List[float], bias: float) -> float:
-        """Evaluate global model on local test data."""
+    def train_round(self, weights: Union[np.ndarray, List[float]],
+                    bias: float) -> Tuple[np.ndarray, float, float]:
+        """Start from the global model and train one round locally."""
+        # Initialize with global model
         self.initialize_model(weights, bias)
-        predictions = self.model.predict(self.X_test)
-        return accuracy_score(self.y_test, predictions)
+        
+        # Train locally
+        return self.train_local(epochs=1)
+    
+    def train_and_submit(self, weights: Union[np.ndarray, List[float]], bias: float) -> float:
+        """Run one round for this client: train from the global model, submit the update."""
+        weights, bias, accuracy = self.train_round(weights, bias)
+        
+        # Submit update (weights as raw float32 bytes, straight from row_view)
+        SESSION.post(
+            UPDATE_RAW_URL,
+            params={
+                "client_id": self.client_id,
+                "bias": bias,
+                "num_samples": len(self.X_train),
+                "local_accuracy": accuracy
+            },
+            data=weights.astype("<f4", copy=False).tobytes(),
+            headers=RAW_HEADERS
+        )
+        return accuracy
+    
+    def evaluate_global(self, weights: Union[np.ndarray, List[float]], bias: float) -> float:
+        """Evaluate global model on local test data."""
+        return _accuracy(self.X_test, self.y_test, weights, bias)
+
+
+def _make_labels_numpy(X: np.ndarray, w: np.ndarray, noise: np.ndarray, out: np.ndarray) -> None:
+    """out[i] = 1 if sigmoid(X[i] @ w) + 0.1 * noise[i] > 0.5 else 0."""
+    out[:] = 1 / (1 + np.exp(-np.dot(X, w))) + noise * 0.1 > 0.5
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _make_labels(X, w, noise, out):
+        # One pass per row: logit, sigmoid, noisy threshold - no full-size temporaries
+        for i in prange(X.shape[0]):
+            z = 0.0
+            for j in range(X.shape[1]):
+                z += X[i, j] * w[j]
+            out[i] = 1 if 1.0 / (1.0 + math.exp(-z)) + noise[i] * 0.1 > 0.5 else 0
+else:
+    _make_labels = _make_labels_numpy
 
 
 def create_heterogeneous_data(num_clients: int, samples_per_client: int,
@@ -83,18 +163,28 @@ def create_heterogeneous_data(num_clients: int, samples_per_client: int,
         X = np.random.randn(samples_per_client, num_features) + client_shift
         
         # Labels based on true weights plus some noise
-        z = np.dot(X, true_weights)
-        probs = 1 / (1 + np.exp(-z))
-        y = (probs + np.random.randn(samples_per_client) * 0.1 > 0.5).astype(int)
+        y = np.empty(samples_per_client, dtype=np.int8)
+        _make_labels(X, true_weights, np.random.randn(samples_per_client), y)
         
-        datasets.append((X, y))
+        # Clients train and evaluate in float32: half the bytes per pass over X
+        datasets.append((X.astype(np.float32), y))
     
     return datasets
 
 
 def run_federated_simulation(num_clients: int = 5, num_rounds: int = 10,
-                              num_features: int = 10, samples_per_client: int = 200):
-    """Run a complete federated learning simulation."""
+                              num_features: int = 10, samples_per_client: int = 200,
+                              in_process: bool = False, data_dir: Optional[str] = None):
+    """
+    Run a complete federated learning simulation.
+    
+    With in_process=True no server is needed: the clients' rows are averaged
+    directly with the server's FedAvg kernel, skipping HTTP, JSON and Pydantic,
+    which makes the simulator usable as a microbenchmark.
+    
+    With data_dir set, each client's training matrix is written there once as
+    .npy and memory-mapped back, for runs whose total data exceeds RAM.
+    """
     
     print("="*70)
     print("FEDERATED LEARNING SIMULATION")
@@ -103,21 +193,33 @@ def run_federated_simulation(num_clients: int = 5, num_rounds: int = 10,
     print(f"Rounds: {num_rounds}")
     print(f"Features: {num_features}")
     print(f"Samples per client: {samples_per_client}")
+    print(f"Mode: {'in-process' if in_process else SERVER_URL}")
     print("="*70)
     
     # Step 1: Initialize server
-    print("\n[SETUP] Initializing FL server...")
-    response = requests.post(f"{FL_ENDPOINT}/init", json={"num_features": num_features})
-    if response.status_code != 200:
-        print(f"Failed to initialize server: {response.text}")
-        return
-    print("Server initialized.")
+    if in_process:
+        # Imported here so the HTTP mode doesn't need the backend package importable
+        from app.federated.aggregator import fedavg
+        # Same initialization as FederatedServer.initialize_global_model
+        global_weights = np.random.randn(num_features) * 0.01
+        global_bias = 0.0
+    else:
+        print("\n[SETUP] Initializing FL server...")
+        response = SESSION.post(INIT_URL, json={"num_features": num_features})
+        if response.status_code != 200:
+            print(f"Failed to initialize server: {response.text}")
+            return
+        print("Server initialized.")
     
     # Step 2: Create client data (non-IID)
     print("\n[SETUP] Creating heterogeneous client data...")
     datasets = create_heterogeneous_data(num_clients, samples_per_client, num_features)
     
     # Step 3: Create and register clients
+    # All client updates live in one float32 matrix (row i = client i's weights + bias),
+    # allocated once and overwritten in place every round
+    client_params = np.empty((num_clients, num_features + 1), dtype=np.float32)
+    sample_counts = np.empty(num_clients, dtype=np.float64)
     clients = []
     for i in range(num_clients):
         client_id = f"client_{i+1}"
@@ -128,19 +230,26 @@ def run_federated_simulation(num_clients: int = 5, num_rounds: int = 10,
             X, y, test_size=0.2, random_state=i
         )
         
+        if data_dir is not None:
+            path = os.path.join(data_dir, f"{client_id}_X_train.npy")
+            np.save(path, X_train)
+            X_train = np.load(path, mmap_mode="r")
+        
         # Create client
-        client = SimulatedClient(client_id, X_train, y_train, X_test, y_test)
+        client = SimulatedClient(client_id, X_train, y_train, X_test, y_test,
+                                 row_view=client_params[i])
         clients.append(client)
+        sample_counts[i] = len(X_train)
         
         # Register with server
-        response = requests.post(
-            f"{FL_ENDPOINT}/register",
-            json={"client_id": client_id}
-        )
+        if not in_process:
+            SESSION.post(REGISTER_URL, json={"client_id": client_id})
         print(f"Registered {client_id}: {len(X_train)} train, {len(X_test)} test samples")
     
     # Track metrics
     round_metrics = []
+    final_model = None  # latest global model, taken from each round's aggregation reply
+    pool = ThreadPoolExecutor(max_workers=num_clients)
     
     # Step 4: Run federated rounds
     print("\n" + "="*70)
@@ -150,47 +259,46 @@ def run_federated_simulation(num_clients: int = 5, num_rounds: int = 10,
     for round_num in range(1, num_rounds + 1):
         print(f"\n--- Round {round_num}/{num_rounds} ---")
         
-        # Start round
-        response = requests.post(f"{FL_ENDPOINT}/round/start")
-        if response.status_code != 200:
-            print(f"Failed to start round: {response.text}")
-            continue
-        
-        round_data = response.json()
-        global_weights = round_data["global_model"]["weights"]
-        global_bias = round_data["global_model"]["bias"]
-        
-        # Each client trains locally
-        local_accuracies = []
-        for client in clients:
-            # Initialize with global model
-            client.initialize_model(global_weights, global_bias)
+        if in_process:
+            # Clients write their rows of client_params; with the bias as the last
+            # column one FedAvg call averages weights and bias together
+            local_accuracies = [
+                accuracy for _, _, accuracy in
+                pool.map(lambda client: client.train_round(global_weights, global_bias), clients)
+            ]
+            aggregated = fedavg(client_params, sample_counts)
+            new_global_weights, new_global_bias = aggregated[:-1], float(aggregated[-1])
+            global_weights, global_bias = new_global_weights, new_global_bias
+            final_model = {"round": round_num, "bias": global_bias}
+        else:
+            # Start round
+            response = SESSION.post(START_URL)
+            if response.status_code != 200:
+                print(f"Failed to start round: {response.text}")
+                continue
             
-            # Train locally
-            weights, bias, accuracy = client.train_local(epochs=1)
-            local_accuracies.append(accuracy)
+            # The global model is the large payload; orjson decodes it far faster than .json()
+            round_data = orjson.loads(response.content)
+            # Converted once here rather than by every client
+            global_weights = np.asarray(round_data["global_model"]["weights"])
+            global_bias = round_data["global_model"]["bias"]
             
-            # Submit update
-            response = requests.post(
-                f"{FL_ENDPOINT}/update",
-                json={
-                    "client_id": client.client_id,
-                    "weights": weights,
-                    "bias": bias,
-                    "num_samples": len(client.X_train),
-                    "local_accuracy": accuracy
-                }
-            )
-        
-        # Aggregate
-        response = requests.post(f"{FL_ENDPOINT}/round/aggregate")
-        if response.status_code != 200:
-            print(f"Failed to aggregate: {response.text}")
-            continue
-        
-        agg_result = response.json()
-        new_global_weights = agg_result["global_model"]["weights"]
-        new_global_bias = agg_result["global_model"]["bias"]
+            # Each client trains locally and submits; clients are independent, so
+            # their training and HTTP round-trips overlap on the pool
+            local_accuracies = list(pool.map(
+                lambda client: client.train_and_submit(global_weights, global_bias), clients
+            ))
+            
+            # Aggregate
+            response = SESSION.post(AGG_URL)
+            if response.status_code != 200:
+                print(f"Failed to aggregate: {response.text}")
+                continue
+            
+            agg_result = orjson.loads(response.content)
+            new_global_weights = np.asarray(agg_result["global_model"]["weights"])
+            new_global_bias = agg_result["global_model"]["bias"]
+            final_model = agg_result["global_model"]
         
         # Evaluate global model on each client's test data
         global_accuracies = []
@@ -222,17 +330,22 @@ def run_federated_simulation(num_clients: int = 5, num_rounds: int = 10,
     for m in round_metrics:
         print(f"{m['round']:<8} {m['avg_local_accuracy']:<15.4f} {m['avg_global_accuracy']:<15.4f}")
     
-    # Get final model
-    response = requests.get(f"{FL_ENDPOINT}/model")
-    final_model = response.json()
+    # Get final model (only needs a request if no round completed)
+    if final_model is None:
+        if in_process:
+            final_model = {"round": 0, "bias": global_bias}
+        else:
+            final_model = SESSION.get(MODEL_URL).json()
     
     print("\nFinal Global Model:")
     print(f"  Round: {final_model['round']}")
     print(f"  Bias: {final_model['bias']:.6f}")
     
     # Cleanup
-    for client in clients:
-        requests.delete(f"{FL_ENDPOINT}/unregister/{client.client_id}")
+    pool.shutdown()
+    if not in_process:
+        for client in clients:
+            SESSION.delete(client.unregister_url)
     
     print("\n" + "="*70)
     print("SIMULATION COMPLETE")
@@ -242,10 +355,21 @@ def run_federated_simulation(num_clients: int = 5, num_rounds: int = 10,
 
 
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Multi-client federated learning simulation")
+    parser.add_argument("--inprocess", action="store_true",
+                        help="aggregate in this process instead of going through the server")
+    parser.add_argument("--data-dir", default=None,
+                        help="memory-map client training data from .npy files in this directory")
+    args = parser.parse_args()
+    
     # Run simulation with different configurations
     run_federated_simulation(
         num_clients=5,
         num_rounds=10,
         num_features=10,
-        samples_per_client=200
+        samples_per_client=200,
+        in_process=args.inprocess,
+        data_dir=args.data_dir
     )
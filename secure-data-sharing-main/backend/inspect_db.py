@@ -2,16 +2,23 @@ import sqlite3
 try:
     conn = sqlite3.connect('app.db')
     cur = conn.cursor()
+    # Memory-mapped reads, as the app uses (app/database.py)
+    cur.execute("PRAGMA mmap_size=268435456")
     cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
     print('TABLES:', cur.fetchall())
     try:
         cur.execute('SELECT id,username,email FROM users LIMIT 50;')
-        rows = cur.fetchall()
-        print('USERS_COUNT', len(rows))
-        for r in rows:
+        # Stream rows off the cursor instead of materializing them with fetchall()
+        cur.arraysize = 50
+        count = 0
+        for r in cur:
             print(r)
+            count += 1
+        print('USERS_COUNT', count)
     except Exception as e:
         print('ERR listing users:', e)
+    # Keep the query planner's statistics current for the app that reopens app.db
+    cur.execute("PRAGMA optimize")
     conn.close()
 except Exception as e:
     print('ERR opening DB:', e)
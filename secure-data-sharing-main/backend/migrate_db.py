@@ -10,29 +10,54 @@ import os
 db_path = os.path.join(os.path.dirname(__file__), "app.db")
 
 def migrate():
-    conn = sqlite3.connect(db_path)
+    # Transactions are opened explicitly below, so the sqlite3 module must not manage them
+    conn = sqlite3.connect(db_path, isolation_level=None)
     cursor = conn.cursor()
+    # Same journal settings the app uses (app/database.py); WAL mode persists in the file
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
 
-    # Check if public_key column exists in users table
+    # Read every table's columns up front, before any schema change
     cursor.execute("PRAGMA table_info(users)")
     user_columns = [col[1] for col in cursor.fetchall()]
-    
+    cursor.execute("PRAGMA table_info(data_access_permissions)")
+    perm_columns = [col[1] for col in cursor.fetchall()]
+    cursor.execute("PRAGMA table_info(file_records)")
+    file_columns = [col[1] for col in cursor.fetchall()]
+
+    # All DDL runs in one transaction: a single commit (and sync) instead of one per
+    # statement, and a failure part-way leaves the schema untouched
+    with conn:
+        cursor.execute("BEGIN")
+        _apply_schema_changes(cursor, user_columns, perm_columns, file_columns)
+    # Fresh planner statistics for the new columns and indexes
+    cursor.execute("ANALYZE")
+
+    # Accounts still on legacy bcrypt are re-hashed on their next login; when this
+    # reaches zero the bcrypt fallback in crud/user.py can be removed
+    cursor.execute(
+        "SELECT COUNT(*) FROM users WHERE substr(hashed_password, 1, 4) IN ('$2a$', '$2b$', '$2y$')"
+    )
+    print(f"Users still on legacy bcrypt hashes: {cursor.fetchone()[0]}")
+
+    cursor.execute("PRAGMA optimize")
+    conn.close()
+    print("\nMigration complete!")
+
+
+def _apply_schema_changes(cursor, user_columns, perm_columns, file_columns):
+    # Check if public_key column exists in users table
     if 'public_key' not in user_columns:
         print("Adding 'public_key' column to users table...")
         cursor.execute("ALTER TABLE users ADD COLUMN public_key TEXT")
-        conn.commit()
         print("Done.")
     else:
         print("'public_key' column already exists in users table.")
 
     # Check if encrypted_aes_key column exists in data_access_permissions table
-    cursor.execute("PRAGMA table_info(data_access_permissions)")
-    perm_columns = [col[1] for col in cursor.fetchall()]
-    
     if 'encrypted_aes_key' not in perm_columns:
         print("Adding 'encrypted_aes_key' column to data_access_permissions table...")
         cursor.execute("ALTER TABLE data_access_permissions ADD COLUMN encrypted_aes_key TEXT")
-        conn.commit()
         print("Done.")
     else:
         print("'encrypted_aes_key' column already exists in data_access_permissions table.")
@@ -40,13 +65,41 @@ def migrate():
     if 'shared_at' not in perm_columns:
         print("Adding 'shared_at' column to data_access_permissions table...")
         cursor.execute("ALTER TABLE data_access_permissions ADD COLUMN shared_at DATETIME DEFAULT CURRENT_TIMESTAMP")
-        conn.commit()
         print("Done.")
     else:
         print("'shared_at' column already exists in data_access_permissions table.")
 
-    conn.close()
-    print("\nMigration complete!")
+    # Check if encryption_mode column exists in file_records table
+    if 'encryption_mode' not in file_columns:
+        print("Adding 'encryption_mode' column to file_records table...")
+        cursor.execute("ALTER TABLE file_records ADD COLUMN encryption_mode TEXT")
+        print("Done.")
+    else:
+        print("'encryption_mode' column already exists in file_records table.")
+
+    if 'content_sha256' not in file_columns:
+        print("Adding 'content_sha256' column to file_records table...")
+        cursor.execute("ALTER TABLE file_records ADD COLUMN content_sha256 TEXT")
+        print("Done.")
+    else:
+        print("'content_sha256' column already exists in file_records table.")
+
+    # Composite index used by every (file, recipient) access check
+    print("Ensuring 'ix_perm_file_user' index on data_access_permissions...")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_perm_file_user "
+        "ON data_access_permissions (file_id, shared_with_user_id)"
+    )
+    print("Done.")
+
+    # Composite index for listing a user's files newest-first
+    print("Ensuring 'ix_files_owner_date' index on file_records...")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS ix_files_owner_date "
+        "ON file_records (owner_id, upload_date DESC)"
+    )
+    print("Done.")
+
 
 if __name__ == "__main__":
     migrate()
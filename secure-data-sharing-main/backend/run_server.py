@@ -9,4 +9,11 @@ sys.path.insert(0, backend_dir)
 if __name__ == "__main__":
     import uvicorn
     os.chdir(backend_dir)
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
+    if os.getenv("ENV", "dev") == "dev":
+        uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
+    else:
+        # No reload supervisor or per-request access log. loop/http "auto" pick uvloop and
+        # httptools when they are installed. One worker: the federated server state
+        # (global model, pending client updates) lives in process memory.
+        uvicorn.run("app.main:app", host="0.0.0.0", port=8000, loop="auto", http="auto",
+                    workers=1, access_log=False)
@@ -1,7 +1,19 @@
-from fastapi.testclient import TestClient
-from app.main import app
-client = TestClient(app)
-resp = client.post('/auth/token', data={'username':'sai','password':'password'})
-print('STATUS', resp.status_code)
-print('TEXT', resp.text)
-print('JSON', resp.json() if resp.text else {})
+def test_token(client, test_user):
+    username, password = test_user
+    resp = client.post('/auth/token', data={'username': username, 'password': password})
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body['token_type'] == 'bearer'
+    # A JWT: header.payload.signature
+    assert isinstance(body['access_token'], str) and body['access_token'].count('.') == 2
+
+    # The token authenticates the user it was issued for
+    me = client.get('/users/me', headers={'Authorization': f"Bearer {body['access_token']}"})
+    assert me.status_code == 200, me.text
+    assert me.json()['username'] == username
+
+
+if __name__ == "__main__":
+    import sys
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,17 @@
+import hashlib
+import os
+from app.core.scanner import ContentScanner, scan_content_for_threats
+
+# Patterns placed so some of them straddle chunk boundaries
+content = os.urandom(50000) + b"<script>" + os.urandom(4093) + b"WScript.Shell" + os.urandom(70000)
+
+expected = scan_content_for_threats(content, "report.pdf")
+assert expected["file_hash"] == hashlib.sha256(content).hexdigest()
+
+for chunk_size in [1, 7, 4096, 65536]:
+    scanner = ContentScanner("report.pdf")
+    for i in range(0, len(content), chunk_size):
+        scanner.update(content[i:i + chunk_size])
+    assert scanner.finalize() == expected, chunk_size
+
+print("CONTENT SCANNER SUCCESS")
@@ -1,11 +1,23 @@
 # Test Federated Learning Implementation
+import orjson
 import requests
 import numpy as np
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 SERVER_URL = "http://localhost:8000"
 FL_ENDPOINT = f"{SERVER_URL}/federated"
 
+# One keep-alive connection pool for every call instead of a new TCP connection per request
+SESSION = requests.Session()
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def post_json(url, payload):
+    """POST payload encoded with orjson; NumPy arrays are serialized without .tolist()."""
+    body = orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return SESSION.post(url, data=body, headers=JSON_HEADERS)
+
 def test_federated_learning():
     """Test the federated learning implementation."""
     
@@ -15,9 +27,9 @@ def test_federated_learning():
     
     # 1. Initialize the global model
     print("\n[1] Initializing global model...")
-    response = requests.post(
+    response = post_json(
         f"{FL_ENDPOINT}/init",
-        json={"num_features": 10}
+        {"num_features": 10}
     )
     assert response.status_code == 200
     init_result = response.json()
@@ -26,7 +38,7 @@ def test_federated_learning():
     
     # 2. Check server status
     print("\n[2] Checking server status...")
-    response = requests.get(f"{FL_ENDPOINT}/status")
+    response = SESSION.get(f"{FL_ENDPOINT}/status")
     assert response.status_code == 200
     status = response.json()
     print(f"    Current round: {status['current_round']}")
@@ -36,16 +48,16 @@ def test_federated_learning():
     print("\n[3] Registering clients...")
     clients = ["client_A", "client_B", "client_C"]
     for client_id in clients:
-        response = requests.post(
+        response = post_json(
             f"{FL_ENDPOINT}/register",
-            json={"client_id": client_id, "metadata": {"test": True}}
+            {"client_id": client_id, "metadata": {"test": True}}
         )
         assert response.status_code == 200
         print(f"    Registered: {client_id}")
     
     # 4. Get global model
     print("\n[4] Getting global model...")
-    response = requests.get(f"{FL_ENDPOINT}/model")
+    response = SESSION.get(f"{FL_ENDPOINT}/model")
     assert response.status_code == 200
     model = response.json()
     print(f"    Round: {model['round']}")
@@ -54,7 +66,7 @@ def test_federated_learning():
     
     # 5. Start a training round
     print("\n[5] Starting training round...")
-    response = requests.post(f"{FL_ENDPOINT}/round/start")
+    response = SESSION.post(f"{FL_ENDPOINT}/round/start")
     assert response.status_code == 200
     start_result = response.json()
     print(f"    Status: {start_result['status']}")
@@ -62,17 +74,20 @@ def test_federated_learning():
     
     # 6. Submit client updates (simulating local training)
     print("\n[6] Submitting client updates...")
-    for i, client_id in enumerate(clients):
-        # Simulate different local model updates
-        np.random.seed(i)
-        weights = (np.random.randn(10) * 0.1).tolist()
-        bias = float(np.random.randn() * 0.1)
+    # Simulate different local model updates: every client's weights and bias in one draw
+    rng = np.random.default_rng(0)
+    W = rng.standard_normal((len(clients), 10)) * 0.1
+    B = rng.standard_normal(len(clients)) * 0.1
+    
+    def submit_update(i, client_id):
+        weights = W[i]
+        bias = float(B[i])
         num_samples = 100 + i * 50
         local_accuracy = 0.75 + i * 0.05
         
-        response = requests.post(
+        response = post_json(
             f"{FL_ENDPOINT}/update",
-            json={
+            {
                 "client_id": client_id,
                 "weights": weights,
                 "bias": bias,
@@ -82,11 +97,17 @@ def test_federated_learning():
         )
         assert response.status_code == 200
         result = response.json()
+        return num_samples, local_accuracy
+    
+    # The clients are independent, so their updates are sent concurrently
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        results = list(pool.map(submit_update, range(len(clients)), clients))
+    for client_id, (num_samples, local_accuracy) in zip(clients, results):
         print(f"    {client_id}: samples={num_samples}, accuracy={local_accuracy:.2f}")
     
     # 7. Aggregate the round
     print("\n[7] Aggregating round...")
-    response = requests.post(f"{FL_ENDPOINT}/round/aggregate")
+    response = SESSION.post(f"{FL_ENDPOINT}/round/aggregate")
     assert response.status_code == 200
     agg_result = response.json()
     print(f"    Status: {agg_result['status']}")
@@ -97,17 +118,17 @@ def test_federated_learning():
     
     # 8. Get training history
     print("\n[8] Getting training history...")
-    response = requests.get(f"{FL_ENDPOINT}/history")
+    response = SESSION.get(f"{FL_ENDPOINT}/history")
     assert response.status_code == 200
     history = response.json()
     print(f"    Rounds completed: {len(history['history'])}")
     
     # 9. Test predictions
     print("\n[9] Testing predictions...")
-    test_data = np.random.randn(5, 10).tolist()
-    response = requests.post(
+    test_data = np.random.randn(5, 10)
+    response = post_json(
         f"{FL_ENDPOINT}/predict",
-        json={"data": test_data}
+        {"data": test_data}
     )
     assert response.status_code == 200
     predictions = response.json()
@@ -117,7 +138,7 @@ def test_federated_learning():
     # 10. Cleanup - unregister clients
     print("\n[10] Unregistering clients...")
     for client_id in clients:
-        response = requests.delete(f"{FL_ENDPOINT}/unregister/{client_id}")
+        response = SESSION.delete(f"{FL_ENDPOINT}/unregister/{client_id}")
         assert response.status_code == 200
         print(f"    Unregistered: {client_id}")
     
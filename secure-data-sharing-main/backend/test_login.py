@@ -1,9 +1,20 @@
-from fastapi.testclient import TestClient
-from app.main import app
-client = TestClient(app)
-resp = client.post('/auth/token', data={'username':'sai','password':'password'})
-print('STATUS', resp.status_code)
-try:
-    print('JSON', resp.json())
-except Exception:
-    print('TEXT', resp.text)
+def test_login(client, test_user):
+    username, password = test_user
+    resp = client.post('/auth/token', data={'username': username, 'password': password})
+    assert resp.status_code == 200, resp.text
+    assert set(resp.json()) == {'access_token', 'token_type'}
+
+
+def test_login_rejects_bad_credentials(client, test_user):
+    username, _ = test_user
+    for data in ({'username': username, 'password': 'wrong-password'},
+                 {'username': 'no_such_user', 'password': 'wrong-password'}):
+        resp = client.post('/auth/token', data=data)
+        assert resp.status_code == 401, resp.text
+        assert resp.json() == {'detail': 'Incorrect username or password'}
+
+
+if __name__ == "__main__":
+    import sys
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
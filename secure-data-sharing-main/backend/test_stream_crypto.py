@@ -0,0 +1,23 @@
+import os
+from app.core.crypto import stream_encryptor, decrypt_data, STREAM_SEGMENT_SIZE
+
+# Sizes around the segment boundary are the interesting cases
+for size in [0, 1, STREAM_SEGMENT_SIZE, STREAM_SEGMENT_SIZE + 1, 3 * STREAM_SEGMENT_SIZE + 17]:
+    data = os.urandom(size)
+
+    # Encrypt in uneven chunks, like an upload arriving from the network
+    encryptor = stream_encryptor()
+    encrypted = b"".join(encryptor.update(data[i:i + 10000]) for i in range(0, size, 10000))
+    encrypted += encryptor.finalize()
+
+    assert decrypt_data(encrypted) == data
+
+    # Dropping the final segment must not decrypt to a silently truncated file
+    if size > STREAM_SEGMENT_SIZE:
+        try:
+            decrypt_data(encrypted[:-100])
+            raise AssertionError("truncated ciphertext was accepted")
+        except Exception as e:
+            assert not isinstance(e, AssertionError)
+
+print("STREAM ENCRYPTION SUCCESS")
@@ -149,16 +149,22 @@ export default function SharedWithMe() {
       setProgressStep("Downloading encrypted file...");
       setDecryptProgress(20);
 
-      const res = await fetch(`http://127.0.0.1:8000/files/download-e2e/${file.id}`, {
-        headers: { Authorization: `Bearer ${token}` },
-      });
+      // Key/metadata and raw bytes come from separate endpoints so the file
+      // is streamed as binary instead of base64 inside a JSON body
+      const [keyRes, dataRes] = await Promise.all([
+        fetch(`http://127.0.0.1:8000/files/download-e2e/${file.id}/key`, {
+          headers: { Authorization: `Bearer ${token}` },
+        }),
+        fetch(`http://127.0.0.1:8000/files/download-e2e/${file.id}/data`, {
+          headers: { Authorization: `Bearer ${token}` },
+        }),
+      ]);
 
-      if (!res.ok) {
+      if (!keyRes.ok || !dataRes.ok) {
         throw new Error("Failed to download file");
       }
 
-      const data = await res.json();
-      const { encrypted_data, encrypted_aes_key, filename } = data;
+      const { encrypted_aes_key, filename } = await keyRes.json();
 
       if (!encrypted_aes_key) {
         throw new Error("No encryption key available for this file");
@@ -185,9 +191,7 @@ export default function SharedWithMe() {
       setProgressStep("Decrypting file content...");
       setDecryptProgress(80);
 
-      // Convert base64 to blob
-      const encryptedBytes = Uint8Array.from(atob(encrypted_data), c => c.charCodeAt(0));
-      const encryptedBlob = new Blob([encryptedBytes]);
+      const encryptedBlob = await dataRes.blob();
 
       const decryptedBlob = await decryptFile(encryptedBlob, aesKey);
 
@@ -264,8 +264,8 @@ const ShareModal = ({ file, onClose, setSuccess, setError }) => {
         setIsSharing(true);
         setError('');
         try {
-            const result = await apiService.shareFile(file.id, recipient);
-            setSuccess(result.message);
+            await apiService.shareFile(file.id, recipient);
+            setSuccess(`File '${file.filename}' shared with '${recipient}'.`);
             onClose();
         } catch (err) {
             setError(err.message);